@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Streaming operating system/browser counts for web server access logs.
+
+Exercise 1.7 prints a tab-separated table of the operating system and
+browser of three hard-coded user strings. This module does the same for
+whole access logs (plain text or gzip), one line at a time:
+
+    lines -> user-agent strings -> UserAgents -> running counts
+
+Every step is a generator, so memory use does not depend on the size of the
+logs. Large plain text logs are split into byte ranges at line boundaries
+and counted in a process pool; gzip files cannot be split, so each one is
+counted by a single worker. The per-worker counts are added up at the end.
+
+Usage:
+
+    python access_logs.py access.log access.log.1.gz --processes 4
+
+"""
+
+import argparse
+import collections
+import gzip
+import multiprocessing
+import os
+
+import user_agents
+
+# Plain text logs smaller than this are not split.
+MIN_RANGE_SIZE = 16 * 1024 * 1024
+
+
+def open_log(path):
+    """ Opens a plain text or gzip access log for reading bytes. """
+    with open(path, 'rb') as probe:
+        magic = probe.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_lines(path, start=0, end=None):
+    """ Yields the decoded lines of a log, or of one byte range of it.
+
+    A line belongs to the range in which it starts, so adjacent ranges
+    never count a line twice or miss one.
+
+    Args:
+        path: Path of the log.
+        start: Byte offset where the range starts (plain text logs only).
+        end: Byte offset where the range ends; the end of file if None.
+
+    """
+
+    with open_log(path) as log_file:
+        if start > 0:
+            # Skip the line that started in the previous range.
+            log_file.seek(start - 1)
+            log_file.readline()
+        position = log_file.tell()
+        for line in log_file:
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            yield line.decode('utf-8', 'replace')
+
+
+def extract_user_agent(line):
+    """ Returns the user-agent field of a log line, or None.
+
+    In the common "combined" log format the user agent is the last quoted
+    field of the line.
+
+    """
+
+    end = line.rfind('"')
+    if end <= 0:
+        return None
+    start = line.rfind('"', 0, end)
+    if start < 0:
+        return None
+    return line[start + 1:end]
+
+
+def iter_user_agents(lines, parser=None):
+    """ Yields the parsed UserAgent of every line that has a user agent. """
+    parser = parser or user_agents.UserAgentParser()
+    for line in lines:
+        user_string = extract_user_agent(line)
+        if user_string is not None:
+            yield parser.parse(user_string)
+
+
+def count_user_agents(parsed):
+    """ Returns a Counter of (os, browser) pairs. """
+    return collections.Counter((ua.os, ua.browser) for ua in parsed)
+
+
+def count_range(task):
+    """ Counts (os, browser) pairs in one (path, start, end) range.
+
+    This is the unit of work of the process pool.
+
+    """
+
+    path, start, end = task
+    return count_user_agents(iter_user_agents(iter_lines(path, start, end)))
+
+
+def split_ranges(path, nranges):
+    """ Returns (path, start, end) tasks that cover the whole log.
+
+    Gzip logs and small logs are a single task.
+
+    """
+
+    with open_log(path) as log_file:
+        compressed = isinstance(log_file, gzip.GzipFile)
+    size = os.path.getsize(path)
+    if compressed or nranges <= 1 or size < 2 * MIN_RANGE_SIZE:
+        return [(path, 0, None)]
+    nranges = min(nranges, size // MIN_RANGE_SIZE)
+    bounds = [size * i // nranges for i in range(nranges + 1)]
+    return [(path, start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def count_logs(paths, processes=None):
+    """ Counts (os, browser) pairs over many logs in a process pool.
+
+    Args:
+        paths: Paths of plain text or gzip logs.
+        processes: Number of worker processes; one per CPU if None. With 1
+            everything runs in this process.
+
+    """
+
+    processes = processes or multiprocessing.cpu_count()
+    tasks = [task for path in paths for task in split_ranges(path, processes)]
+    counts = collections.Counter()
+    if processes == 1 or len(tasks) == 1:
+        for task in tasks:
+            counts.update(count_range(task))
+        return counts
+    pool = multiprocessing.Pool(processes)
+    try:
+        for partial in pool.imap_unordered(count_range, tasks):
+            counts.update(partial)
+    finally:
+        pool.close()
+        pool.join()
+    return counts
+
+
+def format_table(counts):
+    """ Returns the counts as a tab-separated table, most common first. """
+    lines = ['os\tbrowser\tcount']
+    for (os_, browser), count in counts.most_common():
+        lines.append('%s\t%s\t%d' % (os_, browser, count))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count the operating '
+                                     'systems and browsers in access logs.')
+    parser.add_argument('paths', nargs='+', help='plain text or gzip logs')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: CPUs)')
+    args = parser.parse_args(argv)
+    print(format_table(count_logs(args.paths, args.processes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Minimal asyncio HTTP/1.1 client with pooled keep-alive connections.
+
+Only what the scraping exercises need: GET requests over http and https,
+Content-Length, chunked and read-until-close bodies, and redirects. Open
+connections are kept per (scheme, host, port) and reused by later requests
+to the same host, and the number of requests in flight is limited both
+overall and per host:
+
+    async with AsyncHTTPClient(max_connections=20, max_per_host=4) as client:
+        response = await client.get('http://www.bellarmine.edu/analytics/')
+        print(response.status, len(response.body))
+
+"""
+
+import asyncio
+import collections
+import ssl
+import urllib.parse
+
+import html_stream
+
+DEFAULT_TIMEOUT = 10.
+DEFAULT_USER_AGENT = 'bellarmine_py_intro/1.0'
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+READ_SIZE = 64 * 1024
+
+# Characters left as they are when percent-encoding a request path or query.
+PATH_SAFE = "/%:@!$&'()*+,;=~"
+QUERY_SAFE = PATH_SAFE + '?'
+
+
+class HTTPError(IOError):
+    """ Raised for malformed responses and too many redirects. """
+
+
+class Response(object):
+    """ A complete HTTP response.
+
+    Attributes:
+        url: Final URL, after redirects.
+        status: Integer status code.
+        reason: Reason phrase.
+        headers: Dictionary of lowercase header names to values.
+        body: Body bytes.
+
+    """
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def text(self, encoding=None):
+        """ Returns the body decoded with the charset of the response. """
+        if encoding is None:
+            encoding = html_stream.content_charset(self.headers)
+        return self.body.decode(encoding, 'replace')
+
+    def __repr__(self):
+        return '<Response %d %s>' % (self.status, self.url)
+
+
+def split_url(url):
+    """ Returns (scheme, host, port, path) of an http or https URL, ready
+    for the request: the host is IDNA-encoded, and the path and query are
+    percent-encoded as UTF-8 (escapes already present are kept).
+
+    """
+
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('Not an http(s) URL: %r.' % url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        host = parts.hostname.encode('idna').decode('ascii')
+    except UnicodeError:
+        raise ValueError('Bad host name in %r.' % url)
+    path = urllib.parse.quote(parts.path or '/', safe=PATH_SAFE)
+    if parts.query:
+        path += '?' + urllib.parse.quote(parts.query, safe=QUERY_SAFE)
+    return parts.scheme, host, port, path
+
+
+async def read_headers(reader):
+    """ Reads a status line and headers; returns (version, status, reason,
+    headers).
+
+    """
+
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError('Connection closed before the response.')
+    parts = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+    if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+        raise HTTPError('Malformed status line: %r.' % line)
+    version, status = parts[0], int(parts[1])
+    reason = parts[2] if len(parts) > 2 else ''
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        value = value.strip()
+        if name in headers:
+            headers[name] += ', ' + value
+        else:
+            headers[name] = value
+    return version, status, reason, headers
+
+
+async def iter_body(reader, headers, status, method='GET'):
+    """ Yields the body of a response in chunks as it arrives.
+
+    The last value yielded is a bool: whether the connection can be reused.
+
+    """
+
+    if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+        yield True
+        return
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                # Skip trailers.
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            yield await reader.readexactly(size)
+            await reader.readline()
+        yield True
+    elif 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, READ_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            yield chunk
+        yield True
+    else:
+        while True:
+            chunk = await reader.read(READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        yield False
+
+
+class AsyncHTTPClient(object):
+    """ asyncio HTTP client with a keep-alive connection pool.
+
+    Args:
+        max_connections: Maximum number of requests in flight overall.
+        max_per_host: Maximum number of requests in flight per host.
+        timeout: Seconds allowed for each request, including the body, from
+            the moment it gets its connection slots.
+        user_agent: User-Agent header sent with every request.
+
+    """
+
+    def __init__(self, max_connections=20, max_per_host=4,
+                 timeout=DEFAULT_TIMEOUT, user_agent=DEFAULT_USER_AGENT):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self._idle = collections.defaultdict(list)
+        self._host_limits = {}
+        self._limit = None
+        self._ssl_context = None
+        # Number of requests served by a reused connection, for tests.
+        self.reused = 0
+
+    def _host_limit(self, key):
+        if key not in self._host_limits:
+            self._host_limits[key] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[key]
+
+    async def _connect(self, scheme, host, port):
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            return await asyncio.open_connection(host, port,
+                                                 ssl=self._ssl_context)
+        return await asyncio.open_connection(host, port)
+
+    def _release(self, key, writer, reader, reusable):
+        if reusable and not reader.at_eof():
+            self._idle[key].append((reader, writer))
+        else:
+            writer.close()
+
+    async def stream(self, url, headers=None, method='GET'):
+        """ Sends one request and yields (status, reason, headers) followed
+        by the body chunks. No redirects are followed.
+
+        The connection goes back to the pool once the body has been read to
+        the end; a generator closed early closes the connection.
+
+        """
+
+        scheme, host, port, path = split_url(url)
+        key = (scheme, host, port)
+        netloc = '[%s]' % host if ':' in host else host
+        request_headers = collections.OrderedDict([
+            ('Host', netloc if port in (80, 443) else
+             '%s:%d' % (netloc, port)),
+            ('User-Agent', self.user_agent),
+            ('Accept-Encoding', 'identity'),
+            ('Connection', 'keep-alive')])
+        request_headers.update(headers or {})
+        request = '%s %s HTTP/1.1\r\n%s\r\n' % (
+            method, path, ''.join('%s: %s\r\n' % item
+                                  for item in request_headers.items()))
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_connections)
+        async with self._limit, self._host_limit(key):
+            # The timeout starts once the request has its connection slots,
+            # so time spent queueing behind other requests does not count.
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+
+            def within_timeout(awaitable):
+                return asyncio.wait_for(awaitable,
+                                        max(deadline - loop.time(), 0))
+
+            use_pool = True
+            while True:
+                reused = use_pool and bool(self._idle[key])
+                if reused:
+                    reader, writer = self._idle[key].pop()
+                else:
+                    reader, writer = await within_timeout(self._connect(*key))
+                try:
+                    writer.write(request.encode('latin-1'))
+                    await within_timeout(writer.drain())
+                    version, status, reason, response_headers = \
+                        await within_timeout(read_headers(reader))
+                    break
+                except (asyncio.TimeoutError, HTTPError, ValueError):
+                    # A malformed response leaves the connection in an
+                    # unknown state.
+                    writer.close()
+                    raise
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    # A pooled connection may have been closed by the
+                    # server; retry once on a new one.
+                    if not reused:
+                        raise
+                    use_pool = False
+            if reused:
+                self.reused += 1
+            reusable = False
+            try:
+                yield status, reason, response_headers
+                body = iter_body(reader, response_headers, status, method)
+                while True:
+                    try:
+                        chunk = await within_timeout(body.__anext__())
+                    except StopAsyncIteration:
+                        break
+                    if isinstance(chunk, bool):
+                        reusable = chunk
+                    else:
+                        yield chunk
+                connection = response_headers.get('connection', '').lower()
+                if connection == 'close' or (version == 'HTTP/1.0' and
+                                             connection != 'keep-alive'):
+                    reusable = False
+            finally:
+                self._release(key, writer, reader, reusable)
+
+    async def get_stream(self, url, headers=None, method='GET'):
+        """ Same as stream(), following redirects: yields (final url,
+        status, reason, headers) followed by the body chunks.
+
+        Raises:
+            HTTPError after MAX_REDIRECTS redirects.
+
+        """
+
+        for _ in range(MAX_REDIRECTS + 1):
+            stream = self.stream(url, headers, method)
+            try:
+                status, reason, response_headers = await stream.__anext__()
+                location = response_headers.get('location')
+                if status in REDIRECT_STATUSES and location:
+                    # Read the (small) body so the connection can be reused.
+                    async for _ in stream:
+                        pass
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                yield url, status, reason, response_headers
+                async for chunk in stream:
+                    yield chunk
+                return
+            finally:
+                await stream.aclose()
+        raise HTTPError('Too many redirects for %s.' % url)
+
+    async def get(self, url, headers=None, method='GET'):
+        """ Fetches url, following redirects.
+
+        Raises:
+            asyncio.TimeoutError, OSError, asyncio.IncompleteReadError or
+            HTTPError on failure.
+
+        """
+
+        body = []
+        stream = self.get_stream(url, headers, method)
+        try:
+            url, status, reason, response_headers = await stream.__anext__()
+            async for chunk in stream:
+                body.append(chunk)
+        finally:
+            await stream.aclose()
+        return Response(url, status, reason, response_headers, b''.join(body))
+
+    async def close(self):
+        """ Closes every pooled connection. """
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Resumable download of large data files, as in Exercise 4.4.
+
+Exercise 4.4 reads the whole of abalone.data into memory with read(), splits
+it on '\\n' into a second copy, and writes the non-blank lines to
+abalone.csv; any failure means starting over. download() instead:
+
+- streams the response in chunks to <path>.part, so memory use does not
+  depend on the size of the file;
+- resumes an interrupted download where it stopped with an HTTP Range
+  request (guarded by If-Range, so a file that changed on the server is
+  downloaded again from the start), both after a network error within the
+  same call and in a later run;
+- checks the size announced by the server, and optionally an expected size
+  and checksum, before renaming <path>.part to <path>;
+- optionally writes the stripped, non-blank lines to a second file as the
+  chunks arrive, exactly as the Exercise 4.4 loop does.
+
+    download(ABALONE_URL, 'abalone.data', lines_path='abalone.csv')
+
+Usage:
+
+    python bulk_download.py URL PATH --lines abalone.csv --sha256 HEX
+
+"""
+
+import argparse
+import collections
+import hashlib
+import http.client
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+
+import progress
+
+ABALONE_URL = ('http://archive.ics.uci.edu/ml/machine-learning-databases/'
+               'abalone/abalone.data')
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_RETRIES = 5
+DEFAULT_TIMEOUT = 30.
+RETRY_DELAY = 1.
+
+CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+DownloadResult = collections.namedtuple('DownloadResult',
+                                        ['path', 'size', 'digest', 'lines'])
+
+
+class DownloadError(IOError):
+    """ Raised when a download fails for good or does not verify. """
+
+
+class LineNormalizer(object):
+    """ Writes the stripped, non-blank lines of a byte stream, like the
+    Exercise 4.4 loop, holding at most one partial line in memory.
+
+    Args:
+        out_file: File open for writing bytes.
+
+    """
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.lines = 0
+        self._tail = b''
+
+    def write(self, chunk):
+        """ Writes the complete lines of chunk; returns how many. """
+        lines = (self._tail + chunk).split(b'\n')
+        self._tail = lines.pop()
+        kept = [line.strip() for line in lines]
+        kept = [line + b'\n' for line in kept if line]
+        self.out_file.write(b''.join(kept))
+        self.lines += len(kept)
+        return len(kept)
+
+    def close(self):
+        """ Writes the last line, if the stream does not end with '\\n'. """
+        line = self._tail.strip()
+        self._tail = b''
+        if line:
+            self.out_file.write(line + b'\n')
+            self.lines += 1
+
+
+class _PartialFile(object):
+    """ The .part file of a download with the running checksum and the
+    normalized lines of the bytes written so far.
+
+    """
+
+    def __init__(self, part_path, algorithm, lines_path, chunk_size):
+        self.part_path = part_path
+        self.algorithm = algorithm
+        self.lines_path = lines_path
+        self.chunk_size = chunk_size
+        self.part_file = open(part_path, 'ab')
+        self.lines_file = open(lines_path, 'wb') if lines_path else None
+        self.restart(truncate=False)
+
+    @property
+    def size(self):
+        return self.part_file.tell()
+
+    def restart(self, truncate=True):
+        """ Starts the checksum and lines over, and replays the bytes kept
+        in the .part file (none if truncate).
+
+        """
+
+        if truncate:
+            self.part_file.seek(0)
+            self.part_file.truncate()
+        self.hasher = hashlib.new(self.algorithm)
+        self.normalizer = None
+        if self.lines_file is not None:
+            self.lines_file.seek(0)
+            self.lines_file.truncate()
+            self.normalizer = LineNormalizer(self.lines_file)
+        with open(self.part_path, 'rb') as in_file:
+            for chunk in iter(lambda: in_file.read(self.chunk_size), b''):
+                self._digest(chunk)
+
+    def _digest(self, chunk):
+        self.hasher.update(chunk)
+        if self.normalizer is not None:
+            return self.normalizer.write(chunk)
+        return 0
+
+    def write(self, chunk):
+        """ Appends chunk; returns the number of lines completed. """
+        self.part_file.write(chunk)
+        return self._digest(chunk)
+
+    def close(self):
+        """ Flushes everything; returns the number of normalized lines. """
+        self.part_file.close()
+        if self.lines_file is None:
+            return 0
+        self.normalizer.close()
+        self.lines_file.close()
+        return self.normalizer.lines
+
+
+def _meta_path(part_path):
+    return part_path + '.json'
+
+
+def _read_meta(part_path):
+    try:
+        with open(_meta_path(part_path), 'r') as meta_file:
+            return json.load(meta_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write_meta(part_path, meta):
+    with open(_meta_path(part_path), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _open(url, offset, meta, opener, timeout):
+    """ Requests url from byte offset on. Returns the response, or None if
+    the server says there is nothing left (416 at the known end).
+
+    """
+
+    headers = {'Accept-Encoding': 'identity'}
+    if offset:
+        headers['Range'] = 'bytes=%d-' % offset
+        validator = meta.get('etag') or meta.get('last_modified')
+        if validator:
+            headers['If-Range'] = validator
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        return opener(request, timeout=timeout)
+    except urllib.error.HTTPError as error:
+        if error.code == 416 and offset == meta.get('size'):
+            return None
+        raise
+
+
+def _expected_total(response, offset):
+    """ Returns (first byte of the body, total size or None) of a response.
+    """
+
+    if response.status == 206:
+        match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if match is None:
+            raise DownloadError('Bad Content-Range: %r.'
+                                % response.headers.get('Content-Range'))
+        if int(match.group(1)) != offset:
+            raise DownloadError('Asked for bytes from %d, got %s.'
+                                % (offset, match.group(0)))
+        total = match.group(3)
+        return offset, None if total == '*' else int(total)
+    length = response.headers.get('Content-Length')
+    return 0, int(length) if length is not None else None
+
+
+def download(url, path, size=None, checksum=None, algorithm='sha256',
+             lines_path=None, chunk_size=DEFAULT_CHUNK_SIZE,
+             retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT,
+             opener=urllib.request.urlopen, verbose=False):
+    """ Downloads url to path, resuming an earlier partial download.
+
+    Args:
+        url: URL of the file.
+        path: Where to save it; <path>.part holds the partial download.
+        size: Expected size in bytes, if known.
+        checksum: Expected hex digest of the file, if known.
+        algorithm: hashlib algorithm of checksum.
+        lines_path: If given, the stripped non-blank lines of the file are
+            written there as in Exercise 4.4.
+        chunk_size: Bytes read and written at a time.
+        retries: Network errors tolerated before giving up; each retry
+            resumes where the previous attempt stopped.
+        timeout: Seconds allowed for each blocking network operation.
+        opener: Function like urllib.request.urlopen(request, timeout=...).
+        verbose: Whether to report progress (see the progress module).
+
+    Returns:
+        DownloadResult(path, size, hex digest, number of lines written).
+
+    Raises:
+        DownloadError if the download keeps failing or does not verify.
+
+    """
+
+    part_path = path + '.part'
+    meta = _read_meta(part_path) if os.path.exists(part_path) else {}
+    partial = _PartialFile(part_path, algorithm, lines_path, chunk_size)
+    progress_ = None
+    failures = 0
+    try:
+        while True:
+            offset = partial.size
+            try:
+                response = _open(url, offset, meta, opener, timeout)
+                if response is None:
+                    break
+                with response:
+                    start, total = _expected_total(response, offset)
+                    if start != offset:
+                        # The server ignored the Range (or If-Range did not
+                        # match) and sends the whole file: start over.
+                        partial.restart()
+                        offset = 0
+                    if offset == 0:
+                        meta = {'etag': response.headers.get('ETag'),
+                                'last_modified':
+                                    response.headers.get('Last-Modified'),
+                                'size': total}
+                        _write_meta(part_path, meta)
+                    if verbose and progress_ is None:
+                        progress_ = progress.Progress(total or 0,
+                                                      label='downloaded')
+                        progress_.update(offset, 0)
+                    for chunk in iter(lambda: response.read(chunk_size),
+                                      b''):
+                        nlines = partial.write(chunk)
+                        if progress_ is not None:
+                            progress_.update(len(chunk), nlines)
+                if total is not None and partial.size < total:
+                    raise IOError('Connection closed at byte %d of %d.'
+                                  % (partial.size, total))
+                break
+            except DownloadError:
+                raise
+            except (IOError, http.client.HTTPException) as error:
+                failures += 1
+                if isinstance(error, urllib.error.HTTPError):
+                    if error.code == 416 and failures <= retries:
+                        # The .part file does not fit the file on the
+                        # server any more.
+                        partial.restart()
+                        continue
+                    if error.code < 500:
+                        raise DownloadError('%s: %s' % (url, error))
+                if failures > retries:
+                    raise DownloadError('%s: giving up after %d attempts '
+                                        '(%s).' % (url, failures, error))
+                partial.part_file.flush()
+                time.sleep(RETRY_DELAY * failures)
+        downloaded = partial.size
+    finally:
+        nlines = partial.close()
+        if progress_ is not None:
+            progress_.close()
+
+    digest = partial.hasher.hexdigest()
+    problems = []
+    if meta.get('size') is not None and downloaded != meta['size']:
+        problems.append('%d bytes instead of %d announced'
+                        % (downloaded, meta['size']))
+    if size is not None and downloaded != size:
+        problems.append('%d bytes instead of %d expected' % (downloaded, size))
+    if checksum is not None and digest != checksum.lower():
+        problems.append('%s %s instead of %s' % (algorithm, digest, checksum))
+    if problems:
+        # A corrupt partial file cannot be resumed; start over next time.
+        _remove(part_path, _meta_path(part_path))
+        raise DownloadError('%s: %s.' % (url, '; '.join(problems)))
+    os.replace(part_path, path)
+    _remove(_meta_path(part_path))
+    return DownloadResult(path, downloaded, digest, nlines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Download a large file, '
+                                     'resuming a partial download.')
+    parser.add_argument('url', nargs='?', default=ABALONE_URL)
+    parser.add_argument('path', nargs='?', default='abalone.data')
+    parser.add_argument('--lines', default=None,
+                        help='also write the stripped non-blank lines here')
+    parser.add_argument('--size', type=int, default=None,
+                        help='expected size in bytes')
+    parser.add_argument('--sha256', default=None,
+                        help='expected SHA-256 hex digest')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    args = parser.parse_args(argv)
+    result = download(args.url, args.path, args.size, args.sha256,
+                      lines_path=args.lines, retries=args.retries,
+                      verbose=True)
+    print('%s: %d bytes, sha256 %s, %d lines written.'
+          % (result.path, result.size, result.digest, result.lines))
+
+
+if __name__ == '__main__':
+    main()
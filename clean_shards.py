@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Parallel cleaning of many profile shard files.
+
+solution_2.py and solution_3.py clean a single profiles_raw.txt, one line
+after another. This driver hands the shards (and byte ranges of big shards,
+split at line ends) to a multiprocessing pool and writes a cleaned file for
+every shard. Each range is cleaned into a temporary part file; the parts of
+a shard are joined in input order, so the output is the same as cleaning
+the shard sequentially with profile_clean.clean_file().
+
+Usage:
+
+    python clean_shards.py raw/*.txt --out-dir clean --processes 8
+
+writes clean/<shard name> for every shard and reports the throughput. The
+shards must have distinct names.
+
+"""
+
+import argparse
+import io
+import locale
+import multiprocessing
+import os
+import shutil
+import time
+
+import profile_clean
+
+# Shards smaller than this are cleaned by a single worker.
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+
+
+def split_ranges(path, range_size=DEFAULT_RANGE_SIZE):
+    """ Returns the (start, end) byte ranges of path, split at line ends.
+
+    Args:
+        path: Path of a raw shard.
+        range_size: Approximate size of each range in bytes.
+
+    """
+
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as in_file:
+        while bounds[-1] + range_size < size:
+            in_file.seek(bounds[-1] + range_size)
+            in_file.readline()
+            position = in_file.tell()
+            if position >= size:
+                break
+            bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def clean_range(task):
+    """ Cleans one byte range of a shard into a part file.
+
+    This is the unit of work of the process pool.
+
+    Args:
+        task: (in_path, start, end, part_path, min_length) tuple.
+
+    Returns:
+        (part_path, number of bytes read).
+
+    """
+
+    in_path, start, end, part_path, min_length = task
+    with open(in_path, 'rb') as raw_file:
+        raw_file.seek(start)
+        data = raw_file.read(end - start)
+    # Decode and translate newlines the same way open(in_path, 'r') would.
+    in_file = io.StringIO(data.decode(locale.getpreferredencoding(False)),
+                          newline=None)
+    with open(part_path, 'w') as out_file:
+        profile_clean.clean_stream(in_file, out_file, min_length)
+    return part_path, end - start
+
+
+def clean_shards(in_paths, out_dir, processes=None, min_length=None,
+                 range_size=DEFAULT_RANGE_SIZE):
+    """ Cleans every shard in in_paths into out_dir in a process pool.
+
+    Args:
+        in_paths: Paths of raw profile shards.
+        out_dir: Directory for the cleaned shards, which keep their names.
+        processes: Number of worker processes; one per CPU if None.
+        min_length: See profile_clean.clean_stream().
+        range_size: Approximate size in bytes of the ranges big shards are
+            split into.
+
+    Returns:
+        (total bytes read, seconds taken).
+
+    Raises:
+        ValueError if two shards have the same name, since their cleaned
+        files (and part files) would overwrite each other, or if a shard
+        would be overwritten by its own output.
+
+    """
+
+    started = time.time()
+    out_paths = {}
+    for in_path in in_paths:
+        out_path = os.path.join(out_dir, os.path.basename(in_path))
+        if out_path in out_paths:
+            raise ValueError('Shards %s and %s would both be written to %s.'
+                             % (out_paths[out_path], in_path, out_path))
+        if os.path.exists(out_path) and os.path.samefile(in_path, out_path):
+            raise ValueError('Shard %s would be overwritten by its output.'
+                             % in_path)
+        out_paths[out_path] = in_path
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    shards = []
+    tasks = []
+    for out_path, in_path in out_paths.items():
+        parts = []
+        for i, (start, end) in enumerate(split_ranges(in_path, range_size)):
+            part_path = '%s.part%05d' % (out_path, i)
+            parts.append(part_path)
+            tasks.append((in_path, start, end, part_path, min_length))
+        shards.append((out_path, parts))
+
+    pool = multiprocessing.Pool(processes)
+    nbytes = 0
+    try:
+        # Ranges can finish in any order; the parts are joined in input
+        # order below.
+        for _, part_bytes in pool.imap_unordered(clean_range, tasks):
+            nbytes += part_bytes
+    finally:
+        pool.close()
+        pool.join()
+
+    for out_path, parts in shards:
+        with open(out_path, 'wb') as out_file:
+            for part_path in parts:
+                with open(part_path, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, out_file)
+                os.remove(part_path)
+    return nbytes, time.time() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clean profile shards in '
+                                     'parallel.')
+    parser.add_argument('paths', nargs='+', help='raw profile shards')
+    parser.add_argument('--out-dir', default='clean',
+                        help='directory for the cleaned shards')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: CPUs)')
+    parser.add_argument('--min-length', type=int, default=None,
+                        help='keep only alphabetic words this long, as in '
+                        'solution_3.py')
+    parser.add_argument('--range-mb', type=float,
+                        default=DEFAULT_RANGE_SIZE / 1024. / 1024.,
+                        help='split shards into ranges of this many MB')
+    args = parser.parse_args(argv)
+    try:
+        nbytes, seconds = clean_shards(args.paths, args.out_dir,
+                                       args.processes, args.min_length,
+                                       int(args.range_mb * 1024 * 1024))
+    except ValueError as error:
+        parser.error(str(error))
+    print('Cleaned %d shards, %.1f MB in %.2f s (%.1f MB/s).'
+          % (len(args.paths), nbytes / 1e6, seconds,
+             nbytes / 1e6 / max(seconds, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Crawl frontier: which URL to fetch next, and when.
+
+The link loop of Exercise 4.3 fetches every link it meets, in page order:
+a link repeated on the page is fetched again each time, and nothing stops
+it from sending requests to one site as fast as that site answers. A
+Frontier holds the URLs still to fetch and:
+
+- normalizes them (case of scheme and host, default port, '.' and '..'
+  segments, percent escapes, fragment) and accepts each one only once;
+- drops URLs deeper than max_depth links from the start page;
+- limits the request rate of every host with a token bucket (rate requests
+  per second on average, bursts of up to burst requests);
+- optionally limits the requests in flight to every host: a host with
+  max_per_host URLs popped and not yet released is skipped, so a slow host
+  cannot take every connection of the crawler;
+- among the hosts allowed to send a request, serves first the one whose
+  best pending URL has the lowest priority value (by default its depth, so
+  the crawl is breadth-first), and lets other hosts go ahead while a host
+  waits for a token or for one of its requests to finish.
+
+    frontier = Frontier(max_depth=2, rate=1., burst=2)
+    frontier.add('http://www.bellarmine.edu/analytics/')
+    while len(frontier):
+        entry = frontier.pop()
+        if entry is None:
+            time.sleep(frontier.wait_time())
+            continue
+        ...
+        frontier.release(entry.url)
+        frontier.add_links(links, entry.depth + 1, base=entry.url)
+
+The frontier does no I/O; crawler.crawl() drives it with asyncio.
+
+"""
+
+import collections
+import heapq
+import itertools
+import re
+import time
+import urllib.parse
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Characters that never need percent-encoding in a URL.
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+                       '0123456789-._~')
+PERCENT_ESCAPE = re.compile(r'%([0-9A-Fa-f]{2})')
+
+FrontierEntry = collections.namedtuple('FrontierEntry',
+                                       ['priority', 'sequence', 'url',
+                                        'depth'])
+
+
+def _normalize_escape(match):
+    character = chr(int(match.group(1), 16))
+    if character in UNRESERVED:
+        return character
+    return '%' + match.group(1).upper()
+
+
+def remove_dot_segments(path):
+    """ Resolves '.' and '..' segments of a URL path (RFC 3986, 5.2.4). """
+    segments = path.split('/')
+    kept = []
+    for segment in segments:
+        if segment == '..':
+            if len(kept) > 1:
+                kept.pop()
+        elif segment != '.':
+            kept.append(segment)
+    if segments[-1] in ('.', '..'):
+        # 'a/b/..' means the directory 'a/'.
+        kept.append('')
+    return '/'.join(kept)
+
+
+def normalize_url(url, base=None):
+    """ Returns the normal form of an http(s) URL, or None for other URLs.
+
+    Args:
+        url: Absolute URL, or URL relative to base.
+        base: URL of the page the link was found on.
+
+    """
+
+    if base is not None:
+        url = urllib.parse.urljoin(base, url)
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if ':' in netloc:
+        netloc = '[%s]' % netloc
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc += ':%d' % port
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo += ':' + parts.password
+        netloc = userinfo + '@' + netloc
+    path = PERCENT_ESCAPE.sub(_normalize_escape, parts.path)
+    path = remove_dot_segments(path) or '/'
+    query = PERCENT_ESCAPE.sub(_normalize_escape, parts.query)
+    return urllib.parse.urlunsplit((scheme, netloc, path, query, ''))
+
+
+def host_key(url):
+    """ Returns the (scheme, host, port) a normalized URL is fetched from.
+    """
+
+    parts = urllib.parse.urlsplit(url)
+    return parts.scheme, parts.hostname, parts.port or \
+        DEFAULT_PORTS[parts.scheme]
+
+
+class TokenBucket(object):
+    """ Token bucket rate limiter.
+
+    Tokens accumulate at rate per second up to capacity; each request takes
+    one. So at most capacity requests go out at once, and rate requests per
+    second on average.
+
+    Args:
+        rate: Tokens added per second; None for no limit.
+        capacity: Largest number of tokens kept.
+        now: Current time, from the frontier's clock.
+
+    """
+
+    def __init__(self, rate, capacity=1, now=0.):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now):
+        if self.rate is not None and now > self.updated:
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def delay(self, now):
+        """ Seconds until a token is available (0 if one is). """
+        if self.rate is None:
+            return 0.
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """ Takes a token, which must be available. """
+        if self.rate is None:
+            return
+        self._refill(now)
+        self.tokens -= 1
+
+
+class Frontier(object):
+    """ Deduplicated, depth-limited, per-host rate-limited URL queue.
+
+    Args:
+        max_depth: Deepest link level accepted; the start page is depth 0.
+        rate: Requests per second allowed per host; None for no limit.
+        burst: Requests a host may receive at once after being idle.
+        max_urls: Largest number of URLs ever accepted; None for no limit.
+        clock: Function returning the current time in seconds.
+        max_per_host: Most URLs of one host popped and not yet released
+            with release(); None for no limit.
+
+    """
+
+    def __init__(self, max_depth=1, rate=None, burst=1, max_urls=None,
+                 clock=time.monotonic, max_per_host=None):
+        self.max_depth = max_depth
+        self.rate = rate
+        self.burst = burst
+        self.max_urls = max_urls
+        self.clock = clock
+        self.max_per_host = max_per_host
+        self.seen = set()
+        self._sequence = itertools.count()
+        # Pending entries of every host, as heaps of FrontierEntry.
+        self._queues = {}
+        self._buckets = {}
+        self._in_flight = collections.Counter()
+        # Hosts with pending entries and a free request slot: those waiting
+        # for a token, by the time it will be available, and those allowed
+        # to send now, by the priority of their best entry. Saturated hosts
+        # are in neither heap until release() frees a slot.
+        self._waiting = []
+        self._ready = []
+        self._pending = 0
+
+    def __len__(self):
+        return self._pending
+
+    def _bucket(self, host, now):
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst, now)
+        return self._buckets[host]
+
+    def _saturated(self, host):
+        return (self.max_per_host is not None and
+                self._in_flight[host] >= self.max_per_host)
+
+    def _schedule(self, host, now):
+        """ Puts a host with pending entries in the waiting heap. """
+        if self._saturated(host):
+            return
+        delay = self._bucket(host, now).delay(now)
+        heapq.heappush(self._waiting, (now + delay, host))
+
+    def add(self, url, depth=0, priority=None, base=None):
+        """ Adds a URL unless it was seen before or is too deep.
+
+        Args:
+            url: URL to fetch, absolute or relative to base.
+            depth: Number of links followed from the start page.
+            priority: Lower values are fetched first; depth by default.
+            base: URL of the page the link was found on.
+
+        Returns:
+            The normalized URL if it was added, None otherwise.
+
+        """
+
+        if depth > self.max_depth:
+            return None
+        if self.max_urls is not None and len(self.seen) >= self.max_urls:
+            return None
+        url = normalize_url(url, base)
+        if url is None or url in self.seen:
+            return None
+        self.seen.add(url)
+        host = host_key(url)
+        entry = FrontierEntry(depth if priority is None else priority,
+                              next(self._sequence), url, depth)
+        queue = self._queues.get(host)
+        if queue:
+            heapq.heappush(queue, entry)
+        else:
+            self._queues[host] = [entry]
+            self._schedule(host, self.clock())
+        self._pending += 1
+        return url
+
+    def add_links(self, links, depth, base=None):
+        """ Adds the links found on a page; returns how many were new. """
+        return sum(1 for link in links
+                   if self.add(link, depth, base=base) is not None)
+
+    def _promote(self, now):
+        """ Moves the hosts whose token is available to the ready heap. """
+        while self._waiting and self._waiting[0][0] <= now:
+            _, host = heapq.heappop(self._waiting)
+            best = self._queues[host][0]
+            heapq.heappush(self._ready, (best.priority, best.sequence, host))
+
+    def pop(self, now=None):
+        """ Returns the FrontierEntry to fetch next, taking a token from its
+        host, or None if every pending host must wait. The entry's
+        sequence number gives the order in which URLs were added.
+
+        """
+
+        now = self.clock() if now is None else now
+        self._promote(now)
+        if not self._ready:
+            return None
+        _, _, host = heapq.heappop(self._ready)
+        queue = self._queues[host]
+        entry = heapq.heappop(queue)
+        self._bucket(host, now).take(now)
+        self._in_flight[host] += 1
+        self._pending -= 1
+        if queue:
+            self._schedule(host, now)
+        else:
+            del self._queues[host]
+        return entry
+
+    def release(self, url):
+        """ Frees the request slot of a URL returned by pop(), once it has
+        been fetched (or has failed).
+
+        """
+
+        host = host_key(url)
+        saturated = self._saturated(host)
+        self._in_flight[host] -= 1
+        if self._in_flight[host] <= 0:
+            del self._in_flight[host]
+        if saturated and host in self._queues:
+            self._schedule(host, self.clock())
+
+    def wait_time(self, now=None):
+        """ Seconds until pop() can return a URL; None if nothing is
+        pending, or if every pending host must first get a request slot
+        back with release().
+
+        """
+
+        if not self._pending:
+            return None
+        if self._ready:
+            return 0.
+        if not self._waiting:
+            return None
+        now = self.clock() if now is None else now
+        return max(self._waiting[0][0] - now, 0.)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Concurrent version of the link-following scraper of Exercise 4.3.
+
+Exercise 4.3 fetches every outbound link of a page one after the other with
+blocking urllib2 calls, and hides every error behind a bare except. Here the
+start page is fetched, its http(s) links are extracted, and the links are
+fetched concurrently with asyncio, limited overall and per host, with a
+timeout per request and keep-alive connections reused across requests to
+the same host (see async_http). Every link gives a PageResult with either
+the text of its paragraphs or the error that made it unavailable. Pages
+are parsed while their body arrives (see html_stream), so neither the body
+nor a BeautifulSoup tree of it is held in memory.
+
+Links go through a crawl_frontier.Frontier: each URL is fetched once, links
+of linked pages are followed up to max_depth, and the requests to each host
+can be rate limited:
+
+    results = asyncio.run(crawl('http://www.bellarmine.edu/analytics/'))
+
+Usage:
+
+    python crawler.py http://www.bellarmine.edu/analytics/ --per-host 2 \
+        --depth 2 --rate 1
+
+"""
+
+import argparse
+import asyncio
+import collections
+
+import async_http
+import crawl_frontier
+import html_stream
+
+PageResult = collections.namedtuple('PageResult',
+                                    ['url', 'paragraphs', 'error'])
+
+
+def paragraphs_from_html(html):
+    """ Returns the text of every paragraph of a page, as in Exercise 4.2. """
+    return html_stream.extract(html)[0]
+
+
+def is_outbound(link):
+    """ True for the absolute http(s) links followed by Exercise 4.3. """
+    return bool(link) and (link.startswith('http://') or
+                           link.startswith('https://'))
+
+
+def links_from_html(html):
+    """ Returns the absolute http(s) links of a page, in page order, as in
+    Exercise 4.3 (internal links are skipped).
+
+    """
+
+    return [link for link in html_stream.extract(html)[1] if is_outbound(link)]
+
+
+async def fetch_page(client, url):
+    """ Fetches url, following redirects, and parses the body as it arrives.
+
+    Returns:
+        (status, reason, paragraph texts, outbound links).
+
+    Raises:
+        asyncio.TimeoutError, OSError, asyncio.IncompleteReadError or
+        async_http.HTTPError on failure.
+
+    """
+
+    paragraphs, links = [], []
+    stream = client.get_stream(url)
+    try:
+        _, status, reason, headers = await stream.__anext__()
+        # Without a charset in the headers, the page's own <meta> decides.
+        encoding = html_stream.content_charset(headers, default=None)
+        async for kind, value in html_stream.aiter_events(stream, encoding):
+            if kind == html_stream.PARAGRAPH:
+                paragraphs.append(value)
+            elif is_outbound(value):
+                links.append(value)
+    finally:
+        await stream.aclose()
+    return status, reason, paragraphs, links
+
+
+async def fetch_result(client, url):
+    """ Fetches url; never raises for a bad link.
+
+    Returns:
+        (PageResult, outbound links of the page).
+
+    """
+
+    try:
+        status, reason, paragraphs, links = await fetch_page(client, url)
+    except asyncio.TimeoutError:
+        return PageResult(url, [], 'timed out'), []
+    except (OSError, EOFError, ValueError) as error:
+        # EOFError covers asyncio.IncompleteReadError: the server closed the
+        # connection in the middle of the body.
+        return PageResult(url, [], '%s: %s' % (type(error).__name__,
+                                               error)), []
+    if status >= 400:
+        return PageResult(url, [], 'HTTP %d %s' % (status, reason)), []
+    return PageResult(url, paragraphs, None), links
+
+
+async def fetch_paragraphs(client, url):
+    """ Fetches url and returns its PageResult; never raises for a bad link.
+    """
+
+    result, _ = await fetch_result(client, url)
+    return result
+
+
+async def crawl_frontier_pages(client, frontier, max_connections=20):
+    """ Fetches the URLs of a frontier, and those of the links found, until
+    it is empty.
+
+    At most max_connections pages are fetched at once; when every pending
+    host is waiting for its rate limit, or has frontier.max_per_host
+    requests in flight, fetching pauses until one is not.
+
+    Returns:
+        List of PageResults, in the order the URLs were added.
+
+    """
+
+    results = []
+    tasks = {}
+    try:
+        while True:
+            while len(tasks) < max_connections:
+                entry = frontier.pop()
+                if entry is None:
+                    break
+                task = asyncio.ensure_future(fetch_result(client, entry.url))
+                tasks[task] = entry
+            if not tasks and not len(frontier):
+                break
+            if not tasks:
+                await asyncio.sleep(frontier.wait_time())
+                continue
+            timeout = None
+            if len(tasks) < max_connections:
+                timeout = frontier.wait_time()
+            done, _ = await asyncio.wait(list(tasks), timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                entry = tasks.pop(task)
+                frontier.release(entry.url)
+                result, links = task.result()
+                results.append((entry.sequence, result))
+                if entry.depth < frontier.max_depth:
+                    frontier.add_links(links, entry.depth + 1,
+                                       base=entry.url)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return [result for _, result in sorted(results)]
+
+
+async def crawl(start_url, max_connections=20, max_per_host=4,
+                timeout=async_http.DEFAULT_TIMEOUT, client=None, max_depth=1,
+                rate=None, burst=1, max_pages=None):
+    """ Fetches start_url and then its outbound links concurrently, each
+    distinct URL once.
+
+    Args:
+        start_url: Page whose links are followed.
+        max_connections: Maximum number of requests in flight overall.
+        max_per_host: Maximum number of requests in flight per host.
+        timeout: Seconds allowed per request.
+        client: Optional AsyncHTTPClient to use (and leave open).
+        max_depth: Links followed from the start page; 1 fetches only the
+            pages it links to, as Exercise 4.3 does.
+        rate: Requests per second allowed per host; None for no limit.
+        burst: Requests a host may receive at once after being idle.
+        max_pages: Largest number of pages fetched; None for no limit.
+
+    Returns:
+        (start page PageResult, list of PageResults in the order the links
+        were found). If start_url answers with an HTTP error status, its
+        PageResult has the error and no links are followed.
+
+    Raises:
+        Whatever fetching start_url raises.
+
+    """
+
+    own_client = client is None
+    if own_client:
+        client = async_http.AsyncHTTPClient(max_connections, max_per_host,
+                                            timeout)
+    # The frontier holds back the URLs of a host that already has
+    # max_per_host requests in flight, so they do not take connection slots
+    # that other hosts could use while they wait for the client.
+    frontier = crawl_frontier.Frontier(max_depth, rate, burst, max_pages,
+                                       clock=asyncio.get_running_loop().time,
+                                       max_per_host=max_per_host)
+    try:
+        # The start page counts against its host's rate limit too.
+        entry = None
+        if frontier.add(start_url) is not None:
+            entry = frontier.pop()
+        try:
+            status, reason, paragraphs, links = await fetch_page(client,
+                                                                 start_url)
+        finally:
+            if entry is not None:
+                frontier.release(entry.url)
+        if status >= 400:
+            # An error page's links are not the site's: stop here.
+            return PageResult(start_url, [], 'HTTP %d %s'
+                              % (status, reason)), []
+        start = PageResult(start_url, paragraphs, None)
+        frontier.add_links(links, 1, base=start_url)
+        results = await crawl_frontier_pages(client, frontier,
+                                             max_connections)
+    finally:
+        if own_client:
+            await client.close()
+    return start, results
+
+
+def print_result(result):
+    """ Prints a PageResult the way get_pretty_text_from_url does. """
+    if result.error is not None:
+        print('Link %s is unavailable (%s).' % (result.url, result.error))
+        return
+    for paragraph in result.paragraphs:
+        print(paragraph)
+        print('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the paragraphs of '
+                                     'every page linked from a page.')
+    parser.add_argument('url', nargs='?',
+                        default='http://www.bellarmine.edu/analytics/')
+    parser.add_argument('--connections', type=int, default=20,
+                        help='maximum requests in flight overall')
+    parser.add_argument('--per-host', type=int, default=4,
+                        help='maximum requests in flight per host')
+    parser.add_argument('--timeout', type=float,
+                        default=async_http.DEFAULT_TIMEOUT,
+                        help='seconds allowed per request')
+    parser.add_argument('--depth', type=int, default=1,
+                        help='links followed from the start page')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests per second allowed per host')
+    parser.add_argument('--burst', type=int, default=1,
+                        help='requests a host may receive at once')
+    parser.add_argument('--max-pages', type=int, default=None,
+                        help='largest number of pages fetched')
+    args = parser.parse_args(argv)
+    start, results = asyncio.run(crawl(args.url, args.connections,
+                                       args.per_host, args.timeout,
+                                       max_depth=args.depth, rate=args.rate,
+                                       burst=args.burst,
+                                       max_pages=args.max_pages))
+    print_result(start)
+    for result in results:
+        print_result(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Frequent terms in bounded memory.
+
+Exercise 3.4 puts every token of the corpus in one list and counts it with
+collections.Counter before keeping the terms seen 10+ times. When neither
+the list nor the Counter fits in memory, the frequent terms can still be
+found in one streaming pass with a summary of fixed size:
+
+SpaceSaving(capacity) keeps at most capacity counters. Every term whose true
+count is greater than n / capacity (n = number of tokens seen) is among
+them, and each kept counter overestimates its term's count by at most
+n / capacity (the error is stored with the counter).
+
+CountMinSketch(width, depth) never underestimates a count, and
+overestimates it by more than e * n / width with probability at most
+exp(-depth).
+
+Either summary gives a candidate set; an optional second pass counts the
+candidates exactly, so the result equals the exact keep_set whenever every
+term with count >= min_count is a candidate (guaranteed for SpaceSaving when
+min_count > n / capacity, and for the count-min sketch when fewer than
+capacity terms reach min_count). frequent_terms() issues an
+IncompleteWarning when that is not guaranteed:
+
+    keep_set = frequent_terms('profiles_clean.txt', min_count=10,
+                              capacity=100000, exact=True)
+
+"""
+
+import array
+import collections
+import heapq
+import math
+import warnings
+import zlib
+
+DEFAULT_MIN_COUNT = 10
+DEFAULT_CAPACITY = 100000
+
+
+class IncompleteWarning(UserWarning):
+    """ Issued when some frequent terms may be missing from a result. """
+
+
+def iter_tokens(path):
+    """ Yields the tokens of a cleaned profile file, one line at a time. """
+    with open(path, 'r') as in_file:
+        for line in in_file:
+            for token in line.split():
+                yield token
+
+
+class SpaceSaving(object):
+    """ Space-saving summary of the most frequent items of a stream.
+
+    When a new item arrives and all capacity counters are used, the counter
+    with the smallest count is given to the new item, which inherits that
+    count (plus one) as an upper bound and records it as its error.
+
+    Args:
+        capacity: Maximum number of counters kept.
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.n = 0
+        self.counts = {}
+        self.errors = {}
+        # Lazy min-heap of (count, item); stale entries are skipped.
+        self._heap = []
+
+    def add(self, item, count=1):
+        self.n += count
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            return
+        if len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, item))
+            return
+        # Evict the item with the smallest current count.
+        while True:
+            low, victim = heapq.heappop(self._heap)
+            if counts.get(victim) == low:
+                break
+            if victim in counts:
+                heapq.heappush(self._heap, (counts[victim], victim))
+        del counts[victim]
+        del self.errors[victim]
+        counts[item] = low + count
+        self.errors[item] = low
+        heapq.heappush(self._heap, (low + count, item))
+
+    def update(self, items):
+        """ Adds every item of an iterable. """
+        add = self.add
+        for item in items:
+            add(item)
+
+    @property
+    def max_error(self):
+        """ Upper bound on the overestimate of any count: n / capacity. """
+        return self.n / float(self.capacity)
+
+    def estimate(self, item):
+        """ Returns (upper bound, lower bound) of the count of item. """
+        if item in self.counts:
+            return self.counts[item], self.counts[item] - self.errors[item]
+        return int(self.max_error), 0
+
+    def candidates(self, min_count):
+        """ Items whose count may be at least min_count. """
+        return set(item for item, count in self.counts.items()
+                   if count >= min_count)
+
+    def guaranteed(self, min_count):
+        """ Items whose count is certainly at least min_count. """
+        return set(item for item, count in self.counts.items()
+                   if count - self.errors[item] >= min_count)
+
+    def complete(self, min_count):
+        """ True if candidates(min_count) surely holds every item with count
+        at least min_count.
+
+        """
+
+        return len(self.counts) < self.capacity or \
+            min_count > self.max_error
+
+
+class CountMinSketch(object):
+    """ Count-min sketch of item counts.
+
+    Args:
+        width: Counters per row; the error bound is e * n / width.
+        depth: Number of rows; the bound fails with probability exp(-depth).
+
+    """
+
+    def __init__(self, width=2 ** 20, depth=5):
+        self.width = width
+        self.depth = depth
+        self.n = 0
+        self.rows = [array.array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    @classmethod
+    def from_error(cls, epsilon, delta):
+        """ Sketch whose estimates exceed the true count by more than
+        epsilon * n with probability at most delta.
+
+        """
+
+        return cls(int(math.ceil(math.e / epsilon)),
+                   int(math.ceil(math.log(1. / delta))))
+
+    def _columns(self, item):
+        data = item.encode('utf-8')
+        first = zlib.crc32(data)
+        second = zlib.adler32(data) | 1
+        # Double hashing: row i uses first + i * second.
+        return [(first + i * second) % self.width for i in range(self.depth)]
+
+    def add(self, item, count=1):
+        self.n += count
+        for row, column in zip(self.rows, self._columns(item)):
+            row[column] += count
+
+    def update(self, items):
+        """ Adds every item of an iterable. """
+        add = self.add
+        for item in items:
+            add(item)
+
+    def estimate(self, item):
+        """ Returns an upper bound of the count of item. """
+        return min(row[column] for row, column in
+                   zip(self.rows, self._columns(item)))
+
+    @property
+    def max_error(self):
+        """ Bound e * n / width on the overestimate (with high probability). """
+        return math.e * self.n / self.width
+
+
+def sketch_candidates(path, min_count=DEFAULT_MIN_COUNT, width=2 ** 20,
+                      depth=5, capacity=DEFAULT_CAPACITY):
+    """ Finds candidate frequent terms with a count-min sketch in one pass.
+
+    The sketch itself cannot list items, so terms whose estimate reaches
+    min_count are remembered as they stream by, up to capacity of them.
+    Estimates never fall short, so every term with count >= min_count is
+    found unless that limit is hit.
+
+    Returns:
+        (candidates, sketch, whether no term was left out for lack of
+        capacity).
+
+    """
+
+    sketch = CountMinSketch(width, depth)
+    found = set()
+    complete = True
+    for token in iter_tokens(path):
+        sketch.add(token)
+        if token not in found and sketch.estimate(token) >= min_count:
+            if len(found) < capacity:
+                found.add(token)
+            else:
+                complete = False
+    return found, sketch, complete
+
+
+def exact_counts(path, candidates):
+    """ Counts only the candidate terms exactly, in a second pass. """
+    counts = collections.Counter()
+    for token in iter_tokens(path):
+        if token in candidates:
+            counts[token] += 1
+    return counts
+
+
+def frequent_terms(path='profiles_clean.txt', min_count=DEFAULT_MIN_COUNT,
+                   capacity=DEFAULT_CAPACITY, method='space-saving',
+                   exact=False):
+    """ Returns the keep_set of Exercise 3.4 in bounded memory.
+
+    Args:
+        path: Cleaned profiles, one per line.
+        min_count: Frequency threshold.
+        capacity: Number of counters (space-saving) or maximum number of
+            candidates (count-min).
+        method: 'space-saving' or 'count-min'.
+        exact: Whether to make a second pass that counts the candidates
+            exactly and drops the false positives.
+
+    Warns:
+        IncompleteWarning if capacity was too small to be sure that every
+        term with count >= min_count is in the result.
+
+    """
+
+    if method == 'space-saving':
+        summary = SpaceSaving(capacity)
+        summary.update(iter_tokens(path))
+        candidates = summary.candidates(min_count)
+        complete = summary.complete(min_count)
+    elif method == 'count-min':
+        candidates, _, complete = sketch_candidates(path, min_count,
+                                                    capacity=capacity)
+    else:
+        raise ValueError('Unknown method %r.' % method)
+    if not complete:
+        warnings.warn('%s with capacity %d may have missed terms seen %d+ '
+                      'times; use a larger capacity.'
+                      % (method, capacity, min_count), IncompleteWarning,
+                      stacklevel=2)
+    if not exact:
+        return candidates
+    counts = exact_counts(path, candidates)
+    return set(term for term, count in counts.items() if count >= min_count)
+
+
+if __name__ == '__main__':
+
+    # Compare with the exact keep_set of Exercise 3.4.
+    words = list(iter_tokens('profiles_clean.txt'))
+    term_counts = collections.Counter(words)
+    keep_set = set([k for k in term_counts.keys() if term_counts[k] >= 10])
+    for method in ('space-saving', 'count-min'):
+        approximate = frequent_terms(method=method, capacity=1000)
+        exact = frequent_terms(method=method, capacity=1000, exact=True)
+        print('%s: %d candidates, exact second pass matches: %s'
+              % (method, len(approximate), exact == keep_set))
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Streaming extraction of paragraph text and links from HTML.
+
+get_pretty_text_from_url() builds a whole BeautifulSoup tree of a page only
+to call find_all('p') and get_text(), and Exercise 4.3 builds another one to
+find the <a> tags. A TextExtractor is fed the page as it arrives and emits
+events instead; it only keeps the names of the currently open tags and the
+text of the currently open paragraphs:
+
+- ('paragraph', text) when a <p> closes, with the same text as
+  BeautifulSoup(html, 'html.parser') gives with get_text(), and in the same
+  order as find_all('p') (a paragraph nested in another one is emitted
+  after its parent);
+- ('link', href) for every <a> tag with an href attribute.
+
+    for kind, value in iter_events(response_chunks, 'utf-8'):
+        if kind == PARAGRAPH:
+            print(value)
+
+Bytes are decoded with the given encoding (the charset of the Content-Type
+header). Without one, the first PRESCAN_SIZE bytes are checked for a byte
+order mark and then for a <meta charset> or <meta http-equiv> declaration,
+as browsers and BeautifulSoup do, before falling back to UTF-8.
+
+"""
+
+import codecs
+import collections
+import html
+import html.entities
+import html.parser
+import re
+
+PARAGRAPH = 'paragraph'
+LINK = 'link'
+
+# Tags that never have content, as in BeautifulSoup's HTML tree builders.
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+    'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+    'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track',
+    'wbr'])
+
+# Text inside these tags is left out by get_text().
+HIDDEN_TEXT = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+# Whitespace-only text inside these tags is kept as is.
+PRESERVE_WHITESPACE = frozenset(['pre', 'textarea'])
+
+ASCII_SPACES = frozenset('\x20\x0a\x09\x0c\x0d')
+
+# Bytes searched for a charset declaration, as in the HTML5 prescan.
+PRESCAN_SIZE = 1024
+
+# <meta charset="..."> and <meta http-equiv="Content-Type"
+# content="text/html; charset=...">, as BeautifulSoup matches them.
+META_CHARSET = re.compile(
+    br'<\s*meta[^>]+charset\s*=\s*["\']?([^>]*?)[ /;\'">]', re.I)
+
+BYTE_ORDER_MARKS = ((codecs.BOM_UTF8, 'utf-8-sig'),
+                    (codecs.BOM_UTF16_LE, 'utf-16'),
+                    (codecs.BOM_UTF16_BE, 'utf-16'))
+
+
+def content_charset(headers, default='utf-8'):
+    """ Returns the charset of a response from its lowercase headers, or
+    default if there is none or Python does not know it.
+
+    """
+
+    for part in (headers.get('content-type') or '').split(';')[1:]:
+        name, _, value = part.strip().partition('=')
+        if name.lower() == 'charset' and value:
+            charset = value.strip('"\'')
+            try:
+                codecs.lookup(charset)
+            except LookupError:
+                return default
+            return charset
+    return default
+
+
+def sniff_charset(head):
+    """ Returns the encoding given by the byte order mark or the meta
+    charset declaration at the start of a page, or None.
+
+    Args:
+        head: First bytes of the page (PRESCAN_SIZE are enough).
+
+    """
+
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(mark):
+            return encoding
+    match = META_CHARSET.search(head[:PRESCAN_SIZE])
+    if match is None:
+        return None
+    charset = match.group(1).decode('ascii', 'replace').strip()
+    try:
+        name = codecs.lookup(charset).name
+    except LookupError:
+        return None
+    # A page that declares UTF-16 in ASCII bytes cannot be UTF-16.
+    return 'utf-8' if name.startswith('utf-16') else charset
+
+
+def incremental_decoder(encoding):
+    """ Returns an incremental decoder that replaces undecodable bytes,
+    falling back to UTF-8 for unknown encodings.
+
+    """
+
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')
+    return decoder('replace')
+
+
+class PageDecoder(object):
+    """ Incremental decoder of a page of known or sniffed encoding.
+
+    Args:
+        encoding: Encoding of the page; if None it is found with
+            sniff_charset() once PRESCAN_SIZE bytes (or the whole page) have
+            arrived, and is UTF-8 if the page does not declare one.
+
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self._decoder = None
+        if encoding is not None:
+            self._decoder = incremental_decoder(encoding)
+        self._head = b''
+
+    def decode(self, data, final=False):
+        """ Returns the text of data, possibly held back until the encoding
+        is known.
+
+        """
+
+        if self._decoder is None:
+            self._head += data
+            if len(self._head) < PRESCAN_SIZE and not final:
+                return ''
+            self.encoding = sniff_charset(self._head) or 'utf-8'
+            self._decoder = incremental_decoder(self.encoding)
+            data, self._head = self._head, b''
+        return self._decoder.decode(data, final)
+
+
+class TextExtractor(html.parser.HTMLParser):
+    """ Event-driven extractor of paragraph text and link targets.
+
+    Call feed() with text as it arrives, close() at the end of the page, and
+    collect the events produced so far with pop_events().
+
+    """
+
+    def __init__(self):
+        super(TextExtractor, self).__init__(convert_charrefs=False)
+        # Open tags, innermost last: (name, index of the paragraph or None).
+        self._open = []
+        # Text parts of the open paragraphs, by index.
+        self._parts = {}
+        # Paragraphs by index, None while still open, emitted in order.
+        self._pending = collections.OrderedDict()
+        self._count = 0
+        self._hidden = 0
+        self._preserve = 0
+        # Void tags opened without '/>', whose first matching end tag is
+        # swallowed, as BeautifulSoup does.
+        self._closed_void = []
+        # Pieces of the current run of text, up to the next markup.
+        self._data = []
+        self._events = []
+
+    def pop_events(self):
+        """ Returns the events produced since the last call. """
+        events, self._events = self._events, []
+        return events
+
+    def _end_data(self, cdata=False):
+        """ Adds the current run of text to the open paragraphs. Like
+        BeautifulSoup, a run of ASCII whitespace becomes a single newline
+        or space outside <pre> and <textarea>.
+
+        """
+
+        if not self._data:
+            return
+        text = ''.join(self._data)
+        self._data = []
+        if not self._preserve and ASCII_SPACES.issuperset(text):
+            text = '\n' if '\n' in text else ' '
+        if self._hidden and not cdata:
+            return
+        for parts in self._parts.values():
+            parts.append(text)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._end(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._closed_void.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void:
+            self._closed_void.remove(tag)
+        else:
+            self._end(tag)
+
+    def _start(self, tag, attrs):
+        self._end_data()
+        if tag == 'a':
+            attrs = dict(attrs)
+            if 'href' in attrs:
+                self._events.append((LINK, attrs['href'] or ''))
+        if tag in VOID_ELEMENTS:
+            return
+        index = None
+        if tag == 'p':
+            index = self._count
+            self._count += 1
+            self._parts[index] = []
+            self._pending[index] = None
+        elif tag in HIDDEN_TEXT:
+            self._hidden += 1
+        elif tag in PRESERVE_WHITESPACE:
+            self._preserve += 1
+        self._open.append((tag, index))
+
+    def _end(self, tag):
+        self._end_data()
+        # Like BeautifulSoup: close everything up to the innermost open tag
+        # of that name, and ignore end tags that match no open tag.
+        if not any(name == tag for name, _ in self._open):
+            return
+        while True:
+            name, index = self._open.pop()
+            self._close(name, index)
+            if name == tag:
+                break
+
+    def _close(self, name, index):
+        if index is not None:
+            self._pending[index] = ''.join(self._parts.pop(index))
+            while self._pending:
+                first = next(iter(self._pending))
+                if self._pending[first] is None:
+                    break
+                self._events.append((PARAGRAPH, self._pending.pop(first)))
+        elif name in HIDDEN_TEXT:
+            self._hidden -= 1
+        elif name in PRESERVE_WHITESPACE:
+            self._preserve -= 1
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        # An unknown entity stays as written, without its semicolon, as
+        # BeautifulSoup does.
+        self._data.append(html.entities.html5.get(name + ';', '&' + name))
+
+    def handle_charref(self, name):
+        number = int(name[1:], 16) if name[:1] in 'xX' else int(name)
+        if number == 0 or number > 0x10ffff or 0xd800 <= number <= 0xdfff:
+            self._data.append('\ufffd')
+        elif 0x80 <= number <= 0x9f:
+            # Windows-1252 codes written as references.
+            self._data.append(html.unescape('&#%d;' % number))
+        else:
+            self._data.append(chr(number))
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        # CDATA sections count as text even inside <template>.
+        if data.upper().startswith('CDATA['):
+            self._data.append(data[6:])
+            self._end_data(cdata=True)
+
+    def close(self):
+        """ Finishes the page: flushes buffered text and closes the tags
+        still open.
+
+        """
+
+        super(TextExtractor, self).close()
+        self._end_data()
+        while self._open:
+            self._close(*self._open.pop())
+
+
+def iter_events(chunks, encoding=None):
+    """ Yields the (kind, value) events of a page given in pieces.
+
+    Args:
+        chunks: Iterable of str or bytes pieces of the page.
+        encoding: Encoding of bytes pieces; sniffed from the page if None
+            (see PageDecoder).
+
+    """
+
+    extractor = TextExtractor()
+    decoder = PageDecoder(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        extractor.feed(chunk)
+        for event in extractor.pop_events():
+            yield event
+    extractor.feed(decoder.decode(b'', True))
+    extractor.close()
+    for event in extractor.pop_events():
+        yield event
+
+
+async def aiter_events(chunks, encoding=None):
+    """ Same as iter_events() for an async iterable of chunks, e.g. the body
+    of async_http.AsyncHTTPClient.get_stream().
+
+    """
+
+    extractor = TextExtractor()
+    decoder = PageDecoder(encoding)
+    async for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        extractor.feed(chunk)
+        for event in extractor.pop_events():
+            yield event
+    extractor.feed(decoder.decode(b'', True))
+    extractor.close()
+    for event in extractor.pop_events():
+        yield event
+
+
+def extract(page, encoding=None):
+    """ Returns (paragraph texts, hrefs) of a whole page, str or bytes (of
+    the given encoding, or sniffed if None).
+
+    """
+
+    paragraphs, links = [], []
+    for kind, value in iter_events([page], encoding):
+        (paragraphs if kind == PARAGRAPH else links).append(value)
+    return paragraphs, links
+
+
+if __name__ == '__main__':
+
+    # Exercise 4.2 without building a tree, parsing as the page downloads.
+    import urllib.request
+
+    url = 'http://www.bellarmine.edu/analytics/'
+    with urllib.request.urlopen(url) as connection:
+        chunks = iter(lambda: connection.read(16384), b'')
+        encoding = connection.headers.get_content_charset()
+        for kind, value in iter_events(chunks, encoding):
+            if kind == PARAGRAPH:
+                print(value)
+                print('\n')
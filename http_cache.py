@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Persistent HTTP response cache for the scraping exercises.
+
+get_pretty_text_from_url() downloads its page again on every call, and
+Exercise 4.4 fetches abalone.names and abalone.data fresh on every run. An
+HTTPCache keeps response bodies on disk, keyed by URL, together with their
+ETag and Last-Modified headers:
+
+- while an entry is younger than its time-to-live it is used without any
+  network access;
+- after that it is revalidated with If-None-Match / If-Modified-Since, and
+  a 304 Not Modified answer costs only the headers;
+- the total size of the stored bodies is bounded, and the least recently
+  used entries are evicted first;
+- responses marked Cache-Control: no-store are never written to disk.
+
+    cache = HTTPCache('.http_cache', max_bytes=500 * 1024 * 1024)
+    response = cache.get('http://archive.ics.uci.edu/ml/...abalone.names')
+    get_pretty_text_from_url(url, cache)
+
+cache.get() uses urllib; cache.get_async() does the same through an
+async_http.AsyncHTTPClient for the crawler.
+
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+
+import html_stream
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 3600.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    last_used REAL NOT NULL,
+    cache_control TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+class CachedResponse(object):
+    """ A response served through the cache.
+
+    Attributes:
+        url: Requested URL.
+        status: HTTP status of the stored response.
+        headers: Dictionary with the stored content-type, etag and
+            last-modified headers.
+        body: Body bytes.
+        source: 'cache' (fresh entry, no request), 'revalidated' (304 Not
+            Modified) or 'network' (downloaded).
+
+    """
+
+    def __init__(self, url, status, headers, body, source):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.source = source
+
+    def text(self):
+        """ Returns the body decoded with the charset of the response. """
+        return self.body.decode(html_stream.content_charset(self.headers),
+                                'replace')
+
+    def __repr__(self):
+        return '<CachedResponse %d %s from %s>' % (self.status, self.url,
+                                                   self.source)
+
+
+class HTTPCache(object):
+    """ On-disk, size-bounded LRU cache of HTTP GET responses.
+
+    Args:
+        directory: Where the index (index.db) and the bodies are stored.
+        max_bytes: Upper bound on the total size of the stored bodies.
+        default_ttl: Seconds an entry is used without revalidation, unless
+            the response has a Cache-Control max-age or get() is given a
+            ttl.
+        opener: Function like urllib.request.urlopen(request, timeout=...)
+            used for downloads.
+        timeout: Seconds allowed per request.
+
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 default_ttl=DEFAULT_TTL, opener=urllib.request.urlopen,
+                 timeout=30.):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.opener = opener
+        self.timeout = timeout
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'))
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in
+                   self.connection.execute('PRAGMA table_info(entries)')]
+        if 'cache_control' not in columns:
+            # Index made before Cache-Control was kept.
+            self.connection.execute(
+                'ALTER TABLE entries ADD COLUMN cache_control TEXT')
+
+    def _body_path(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name + '.body')
+
+    def _entry(self, url):
+        row = self.connection.execute(
+            'SELECT status, content_type, etag, last_modified, expires, '
+            'cache_control FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None or not os.path.exists(self._body_path(url)):
+            return None
+        keys = ('status', 'content_type', 'etag', 'last_modified', 'expires',
+                'cache_control')
+        return dict(zip(keys, row))
+
+    def _read(self, url, entry, source):
+        with open(self._body_path(url), 'rb') as body_file:
+            body = body_file.read()
+        self.connection.execute('UPDATE entries SET last_used = ? '
+                                'WHERE url = ?', (time.time(), url))
+        self.connection.commit()
+        headers = {'content-type': entry['content_type'],
+                   'etag': entry['etag'],
+                   'last-modified': entry['last_modified']}
+        return CachedResponse(url, entry['status'], headers, body, source)
+
+    @staticmethod
+    def _no_store(headers):
+        return 'no-store' in (headers.get('cache-control') or '').lower()
+
+    def _ttl(self, headers, ttl):
+        if ttl is not None:
+            return ttl
+        cache_control = (headers.get('cache-control') or '').lower()
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            return 0.
+        match = MAX_AGE.search(cache_control)
+        if match:
+            return float(match.group(1))
+        return self.default_ttl
+
+    def conditional_headers(self, url):
+        """ Returns the If-None-Match/If-Modified-Since headers for url. """
+        entry = self._entry(url)
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def lookup(self, url):
+        """ Returns the CachedResponse of a fresh entry for url, or None. """
+        entry = self._entry(url)
+        if entry is not None and entry['expires'] > time.time():
+            return self._read(url, entry, 'cache')
+        return None
+
+    def store(self, url, status, headers, body, ttl=None):
+        """ Stores a downloaded response and evicts old entries if needed.
+
+        Args:
+            url: Requested URL.
+            status: HTTP status code.
+            headers: Dictionary of lowercase header names to values.
+            body: Body bytes.
+            ttl: Seconds to use the entry without revalidation.
+
+        """
+
+        if self._no_store(headers):
+            # The server forbids keeping this response, or an older one.
+            self.remove(url)
+            return CachedResponse(url, status, headers, body, 'network')
+        if len(body) > self.max_bytes:
+            return CachedResponse(url, status, headers, body, 'network')
+        path = self._body_path(url)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path + '.tmp', 'wb') as body_file:
+            body_file.write(body)
+        os.replace(path + '.tmp', path)
+        now = time.time()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO entries (url, status, content_type, etag, '
+            'last_modified, size, expires, last_used, cache_control) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (url, status, headers.get('content-type'), headers.get('etag'),
+             headers.get('last-modified'), len(body),
+             now + self._ttl(headers, ttl), now,
+             headers.get('cache-control')))
+        self.connection.commit()
+        self.evict()
+        return CachedResponse(url, status, headers, body, 'network')
+
+    def revalidated(self, url, headers, ttl=None):
+        """ Marks the entry for url fresh again after a 304 Not Modified.
+
+        Returns:
+            The CachedResponse, or None if the entry was removed (e.g.
+            evicted by another process) before the 304 arrived; the body
+            then has to be requested again without conditional headers.
+
+        """
+
+        entry = self._entry(url)
+        if entry is None:
+            return None
+        if not headers.get('cache-control'):
+            # A 304 without Cache-Control keeps the policy of the stored
+            # response (e.g. max-age=0 or no-cache: revalidate every time).
+            headers = dict(headers, **{'cache-control':
+                                       entry['cache_control']})
+        self.connection.execute(
+            'UPDATE entries SET expires = ?, etag = COALESCE(?, etag), '
+            'last_modified = COALESCE(?, last_modified), '
+            'cache_control = ? WHERE url = ?',
+            (time.time() + self._ttl(headers, ttl), headers.get('etag'),
+             headers.get('last-modified'), headers.get('cache-control'), url))
+        try:
+            response = self._read(url, entry, 'revalidated')
+        except (IOError, OSError):
+            return None
+        if self._no_store(headers):
+            self.remove(url)
+        return response
+
+    def evict(self):
+        """ Removes least recently used entries until the bodies fit in
+        max_bytes.
+
+        """
+
+        total = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute(
+            'SELECT url, size FROM entries ORDER BY last_used').fetchall()
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.remove(url, commit=False)
+            total -= size
+        self.connection.commit()
+
+    def remove(self, url, commit=True):
+        """ Drops the entry for url, if any. """
+        self.connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+        try:
+            os.remove(self._body_path(url))
+        except OSError:
+            pass
+        if commit:
+            self.connection.commit()
+
+    def get(self, url, ttl=None):
+        """ Returns the response for url, from the cache when possible.
+
+        Args:
+            url: URL to fetch.
+            ttl: Seconds to use a new or revalidated entry without asking
+                the server again; from the response or the default if None.
+
+        Raises:
+            urllib.error.URLError (including HTTPError for 4xx/5xx).
+
+        """
+
+        cached = self.lookup(url)
+        if cached is not None:
+            return cached
+        conditional = self.conditional_headers(url)
+        while True:
+            request = urllib.request.Request(url, headers=conditional)
+            try:
+                connection = self.opener(request, timeout=self.timeout)
+                break
+            except urllib.error.HTTPError as error:
+                if error.code != 304 or not conditional:
+                    raise
+                cached = self.revalidated(url, _lower_headers(error.headers),
+                                          ttl)
+                if cached is not None:
+                    return cached
+                # The entry is gone: ask for the whole body.
+                conditional = {}
+        with connection:
+            body = connection.read()
+            headers = _lower_headers(connection.headers)
+            status = connection.status
+        return self.store(url, status, headers, body, ttl)
+
+    async def get_async(self, client, url, ttl=None):
+        """ Same as get(), through an async_http.AsyncHTTPClient. """
+        cached = self.lookup(url)
+        if cached is not None:
+            return cached
+        conditional = self.conditional_headers(url)
+        response = await client.get(url, headers=conditional)
+        if response.status == 304 and conditional:
+            cached = self.revalidated(url, response.headers, ttl)
+            if cached is not None:
+                return cached
+            # The entry is gone: ask for the whole body.
+            response = await client.get(url)
+        if response.status != 200:
+            return CachedResponse(url, response.status, response.headers,
+                                  response.body, 'network')
+        return self.store(url, response.status, response.headers,
+                          response.body, ttl)
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _lower_headers(headers):
+    return dict((name.lower(), value) for name, value in headers.items())
+
+
+def get_pretty_text_from_url(url_, cache):
+    """ Prints the text of every paragraph of a page, as in Exercise 4.2,
+    downloading the page only if it changed.
+
+    Args:
+        url_: The URL to which we will connect.
+        cache: HTTPCache to fetch through.
+
+    """
+
+    response = cache.get(url_)
+    encoding = html_stream.content_charset(response.headers, default=None)
+    for paragraph in html_stream.extract(response.body, encoding)[0]:
+        print(paragraph)
+        print('\n')
+
+
+if __name__ == '__main__':
+
+    # Exercise 4.4 through the cache: the second run only revalidates.
+    with HTTPCache() as cache:
+        for url in ('http://archive.ics.uci.edu/ml/machine-learning-databases/'
+                    'abalone/abalone.names',
+                    'http://archive.ics.uci.edu/ml/machine-learning-databases/'
+                    'abalone/abalone.data'):
+            response = cache.get(url)
+            print('%s: %d bytes from %s' % (url, len(response.body),
+                                            response.source))
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Approximate profile matching with MinHash and locality-sensitive hashing.
+
+Exact matching (profile_match) compares every profile with every other one.
+Here each profile's set of terms is summarized by a MinHash signature: for
+each of num_perm random hash functions, the smallest hash of any of its
+terms. Two profiles agree on a signature entry with probability equal to
+the Jaccard similarity of their term sets. Signatures are cut into bands of
+rows; profiles that agree on a whole band land in the same bucket, and only
+profiles sharing a bucket with the query are compared:
+
+    index = MinHashLSH.from_corpus(corpus, num_perm=128, threshold=0.3)
+    index.query(0, k=5)          # [(profile, estimated Jaccard), ...]
+
+A pair with Jaccard similarity s becomes a candidate with probability
+1 - (1 - s ** rows) ** bands. Lowering threshold (more, shorter bands)
+raises recall at the cost of more candidates. Run this file to measure
+recall against the exact Jaccard ranking on a corpus.
+
+"""
+
+import argparse
+import collections
+import time
+import zlib
+
+import numpy as np
+import scipy.sparse
+
+import profile_match
+
+# Hashes are computed modulo this Mersenne prime, so that products of two
+# values below it still fit in 64 bits.
+PRIME = (1 << 31) - 1
+EMPTY = PRIME
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.3
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def term_hashes(terms):
+    """ Returns a stable 31-bit hash of every term (crc32, mod PRIME). """
+    return np.array([zlib.crc32(term.encode('utf-8')) % PRIME
+                     for term in terms], dtype=np.uint64)
+
+
+def permutations(num_perm, seed=1):
+    """ Returns the (a, b) coefficients of num_perm hash functions
+    h(x) = (a * x + b) mod PRIME.
+
+    """
+
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, PRIME, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, PRIME, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+def signatures(corpus, num_perm=DEFAULT_NUM_PERM, seed=1,
+               block_size=DEFAULT_BLOCK_SIZE):
+    """ Returns the MinHash signatures of every profile in a vocab.Corpus.
+
+    Profiles are processed block_size at a time: the hashes of all tokens
+    of the block are computed as one (num_perm, tokens) array, and the
+    minimum of each profile's columns is taken with np.minimum.reduceat.
+
+    Returns:
+        Array of shape (number of profiles, num_perm). Empty profiles have
+        every entry equal to EMPTY.
+
+    """
+
+    a, b = permutations(num_perm, seed)
+    hashes = term_hashes(corpus.vocabulary.terms)
+    ids, offsets = corpus.arrays()
+    nprofiles = len(corpus)
+    result = np.full((nprofiles, num_perm), EMPTY, dtype=np.uint64)
+    for start in range(0, nprofiles, block_size):
+        stop = min(start + block_size, nprofiles)
+        begin, end = offsets[start], offsets[stop]
+        if begin == end:
+            continue
+        values = (a[:, None] * hashes[ids[begin:end]][None, :] +
+                  b[:, None]) % PRIME
+        starts = offsets[start:stop] - begin
+        lengths = np.diff(offsets[start:stop + 1])
+        nonempty = lengths > 0
+        minima = np.minimum.reduceat(values, starts[nonempty], axis=1)
+        result[start + np.flatnonzero(nonempty)] = minima.T
+    return result
+
+
+def choose_bands(num_perm, threshold):
+    """ Returns (bands, rows), bands * rows <= num_perm, whose S-curve
+    threshold (1 / bands) ** (1 / rows) is closest to threshold.
+
+    """
+
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1. / bands) ** (1. / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def candidate_probability(similarity, bands, rows):
+    """ Probability that a pair with this Jaccard similarity is a candidate. """
+    return 1. - (1. - similarity ** rows) ** bands
+
+
+class MinHashLSH(object):
+    """ Banded LSH index of MinHash signatures.
+
+    Args:
+        signatures: Array of shape (number of profiles, num_perm).
+        bands: Number of bands.
+        rows: Signature entries per band; bands * rows <= num_perm.
+
+    """
+
+    def __init__(self, signatures, bands, rows):
+        self.signatures = signatures
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [collections.defaultdict(list) for _ in range(bands)]
+        for band in range(bands):
+            keys = self._band_keys(signatures, band)
+            buckets = self.buckets[band]
+            for profile, key in enumerate(keys):
+                buckets[key].append(profile)
+        empty = np.all(signatures == EMPTY, axis=1)
+        self._empty = set(np.flatnonzero(empty).tolist())
+
+    @classmethod
+    def from_corpus(cls, corpus, num_perm=DEFAULT_NUM_PERM,
+                    threshold=DEFAULT_THRESHOLD, seed=1):
+        """ Builds an index of a vocab.Corpus, banded for threshold. """
+        bands, rows = choose_bands(num_perm, threshold)
+        return cls(signatures(corpus, num_perm, seed), bands, rows)
+
+    def _band_keys(self, signatures, band):
+        # One bytes key per profile for the rows of this band.
+        part = np.ascontiguousarray(
+            signatures[:, band * self.rows:(band + 1) * self.rows])
+        return [row.tobytes() for row in part]
+
+    def candidates(self, profile):
+        """ Returns the set of profiles sharing a bucket with profile. """
+        if profile in self._empty:
+            return set()
+        found = set()
+        signature = self.signatures[profile:profile + 1]
+        for band in range(self.bands):
+            key = self._band_keys(signature, band)[0]
+            found.update(self.buckets[band].get(key, ()))
+        found.discard(profile)
+        return found - self._empty
+
+    def similarity(self, profile, others):
+        """ Estimated Jaccard similarity of profile with each of others. """
+        others = np.asarray(sorted(others), dtype=np.int64)
+        agree = self.signatures[others] == self.signatures[profile]
+        return others, agree.mean(axis=1)
+
+    def query(self, profile, k=5):
+        """ Returns up to k (profile, estimated Jaccard) best matches. """
+        found = self.candidates(profile)
+        if not found:
+            return []
+        others, estimates = self.similarity(profile, found)
+        order = np.lexsort((others, -estimates))[:k]
+        return list(zip(others[order].tolist(), estimates[order].tolist()))
+
+    def __len__(self):
+        return len(self.signatures)
+
+
+def exact_top_jaccard(corpus, k=5, block_size=DEFAULT_BLOCK_SIZE):
+    """ Exact top-k Jaccard matches of every profile, for the benchmark.
+
+    Returns:
+        List with the set of the k best other profiles of every profile
+        (fewer if fewer have any term in common).
+
+    """
+
+    matrix = profile_match.doc_term_matrix(corpus)
+    matrix.data[:] = 1.
+    sizes = np.diff(matrix.indptr)
+    transposed = matrix.T.tocsc()
+    result = []
+    for start in range(0, matrix.shape[0], block_size):
+        stop = min(start + block_size, matrix.shape[0])
+        common = scipy.sparse.csr_matrix(matrix[start:stop] @ transposed)
+        for row in range(stop - start):
+            begin, end = common.indptr[row], common.indptr[row + 1]
+            columns = common.indices[begin:end]
+            shared = common.data[begin:end]
+            jaccard = shared / (sizes[start + row] + sizes[columns] - shared)
+            keep = columns != start + row
+            columns, jaccard = columns[keep], jaccard[keep]
+            order = np.lexsort((columns, -jaccard))[:k]
+            result.append(set(columns[order].tolist()))
+    return result
+
+
+def benchmark(corpus, k=5, num_perm=DEFAULT_NUM_PERM,
+              threshold=DEFAULT_THRESHOLD, nqueries=None):
+    """ Measures recall@k of LSH queries against the exact Jaccard ranking.
+
+    Args:
+        corpus: vocab.Corpus of profiles.
+        k: Number of matches per query.
+        num_perm: Signature length.
+        threshold: LSH similarity threshold (see choose_bands()).
+        nqueries: Number of profiles to query; all by default.
+
+    Returns:
+        Dictionary with recall, average candidates per query and timings.
+
+    """
+
+    started = time.time()
+    index = MinHashLSH.from_corpus(corpus, num_perm, threshold)
+    build_seconds = time.time() - started
+    queries = range(len(corpus) if nqueries is None
+                    else min(nqueries, len(corpus)))
+
+    started = time.time()
+    approximate = [set(p for p, _ in index.query(q, k)) for q in queries]
+    ncandidates = sum(len(index.candidates(q)) for q in queries)
+    query_seconds = time.time() - started
+
+    started = time.time()
+    exact = exact_top_jaccard(corpus, k)
+    exact_seconds = time.time() - started
+
+    relevant = sum(len(exact[q]) for q in queries)
+    found = sum(len(exact[q] & approximate[i]) for i, q in enumerate(queries))
+    return {'bands': index.bands, 'rows': index.rows,
+            'recall': found / float(max(relevant, 1)),
+            'candidates_per_query': ncandidates / float(max(len(queries), 1)),
+            'build_seconds': build_seconds,
+            'query_seconds': query_seconds,
+            'exact_seconds': exact_seconds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recall of MinHash LSH '
+                                     'profile matching against exact '
+                                     'Jaccard ranking.')
+    parser.add_argument('path', nargs='?', default='profiles_clean.txt',
+                        help='cleaned profiles, one per line')
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--num-perm', type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument('--threshold', type=float, nargs='+',
+                        default=[0.1, 0.2, 0.3, 0.5])
+    parser.add_argument('--queries', type=int, default=None)
+    args = parser.parse_args(argv)
+    corpus = profile_match.load_corpus(args.path)
+    print('threshold\tbands\trows\trecall\tcandidates\tbuild_s\tquery_s\t'
+          'exact_s')
+    for threshold in args.threshold:
+        result = benchmark(corpus, args.k, args.num_perm, threshold,
+                           args.queries)
+        print('%g\t%d\t%d\t%.3f\t%.1f\t%.3f\t%.3f\t%.3f' % (
+            threshold, result['bands'], result['rows'], result['recall'],
+            result['candidates_per_query'], result['build_seconds'],
+            result['query_seconds'], result['exact_seconds']))
+
+
+if __name__ == '__main__':
+    main()
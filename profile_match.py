@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Profile matching with a sparse document-term matrix.
+
+Exercise 3.5 asks which profiles are the best match, but only writes out the
+term counts of every profile to compare by eye. Here the cleaned profiles
+become a SciPy CSR matrix (one row per profile, one column per term),
+optionally TF-IDF weighted and scaled to unit length, so that the cosine
+similarity of every pair of profiles is one sparse matrix product. The
+product is computed for a block of rows at a time, and only the top k
+matches of each row are kept, so memory stays bounded for large corpora:
+
+    corpus = load_corpus('profiles_clean.txt')
+    matrix = tfidf(doc_term_matrix(corpus))
+    indices, scores = top_matches(matrix, k=3)
+
+"""
+
+import numpy as np
+import scipy.sparse
+
+import vocab
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def load_corpus(path='profiles_clean.txt'):
+    """ Reads cleaned profiles, one per line, into a vocab.Corpus. """
+    corpus = vocab.Corpus()
+    with open(path, 'r') as in_file:
+        for line in in_file:
+            corpus.add(line.split())
+    return corpus
+
+
+def doc_term_matrix(corpus, keep_mask=None):
+    """ Returns the CSR matrix of term counts, profiles by term ids.
+
+    The corpus' ids and offsets already are the column indices and row
+    pointers of a CSR matrix; repeated terms are summed into counts.
+
+    Args:
+        corpus: vocab.Corpus of profiles.
+        keep_mask: Optional boolean array over term ids; the columns of the
+            other terms are left empty.
+
+    """
+
+    ids, offsets = corpus.arrays()
+    data = np.ones(len(ids), dtype=np.float64)
+    if keep_mask is not None:
+        data[~keep_mask[ids]] = 0.
+    matrix = scipy.sparse.csr_matrix(
+        (data, ids.astype(np.int64), offsets),
+        shape=(len(corpus), len(corpus.vocabulary)))
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def normalize_rows(matrix):
+    """ Scales every row of a CSR matrix to unit Euclidean length. """
+    matrix = matrix.tocsr(copy=True)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+    return matrix
+
+
+def tfidf(matrix, normalize=True):
+    """ Returns the TF-IDF weighted version of a term count matrix.
+
+    Uses the smoothed idf = log((1 + n) / (1 + df)) + 1, where n is the
+    number of profiles and df the number of profiles containing the term.
+
+    Args:
+        matrix: CSR matrix of term counts.
+        normalize: Whether to scale the rows to unit length, so that dot
+            products are cosine similarities.
+
+    """
+
+    matrix = matrix.tocsr(copy=True)
+    nrows = matrix.shape[0]
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1. + nrows) / (1. + df)) + 1.
+    matrix.data *= idf[matrix.indices]
+    return normalize_rows(matrix) if normalize else matrix
+
+
+def top_matches(matrix, k=5, block_size=DEFAULT_BLOCK_SIZE, normalize=True):
+    """ Finds the k most similar other profiles of every profile.
+
+    Similarities are computed for block_size rows at a time as a sparse
+    product with the whole matrix, so only one block of similarities is in
+    memory at once.
+
+    Args:
+        matrix: CSR matrix, one row per profile.
+        k: Number of matches to return per profile.
+        block_size: Number of rows compared per product.
+        normalize: Whether to scale rows to unit length first (cosine
+            similarity); pass False if they already are.
+
+    Returns:
+        (indices, scores): two arrays of shape (number of profiles, k), best
+        match first. Missing matches have index -1 and score 0.
+
+    """
+
+    if normalize:
+        matrix = normalize_rows(matrix)
+    nrows = matrix.shape[0]
+    indices = np.full((nrows, k), -1, dtype=np.int64)
+    scores = np.zeros((nrows, k), dtype=np.float64)
+    transposed = matrix.T.tocsc()
+    for start in range(0, nrows, block_size):
+        stop = min(start + block_size, nrows)
+        similarities = (matrix[start:stop] @ transposed).tocsr()
+        similarities.sum_duplicates()
+        for row in range(stop - start):
+            begin, end = similarities.indptr[row], similarities.indptr[row + 1]
+            columns = similarities.indices[begin:end]
+            values = similarities.data[begin:end]
+            keep = (columns != start + row) & (values > 0)
+            columns = columns[keep]
+            values = values[keep]
+            if len(values) > k:
+                best = np.argpartition(-values, k - 1)[:k]
+                columns = columns[best]
+                values = values[best]
+            # Best first; ties go to the lower profile index.
+            order = np.lexsort((columns, -values))
+            indices[start + row, :len(order)] = columns[order]
+            scores[start + row, :len(order)] = values[order]
+    return indices, scores
+
+
+def best_matches(matrix, block_size=DEFAULT_BLOCK_SIZE):
+    """ Returns (index, score) of the single best match of every profile. """
+    indices, scores = top_matches(matrix, k=1, block_size=block_size)
+    return indices[:, 0], scores[:, 0]
+
+
+if __name__ == '__main__':
+
+    # Exercise 3.5: which profiles are the best match?
+    corpus = load_corpus('profiles_clean_freq.txt')
+    matrix = tfidf(doc_term_matrix(corpus))
+    indices, scores = best_matches(matrix)
+    for i, (j, score) in enumerate(zip(indices, scores)):
+        print('Profile %d best matches profile %d (cosine similarity %.3f).'
+              % (i + 1, j + 1, score))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Single-pass version of solution_3.py.
+
+solution_3.py reads the profiles four times: to count the lines, to clean
+them, to build a list of every word for the global Counter, and again to
+write profiles_clean_freq.txt and profiles_term_counts.txt. Here the raw
+file is read once. While it is read, each line is cleaned (and written to
+profiles_clean.txt) and its tokens are added to a vocab.Corpus, which keeps
+every distinct term once and the profiles as arrays of integer term ids.
+Once the whole file is read, the global counts, the frequency filter and
+the per-profile term counts are computed on the ids and written straight
+from memory:
+
+    corpus = run('profiles_raw.txt')
+
+produces the same three files as solution_3.py.
+
+"""
+
+import numpy as np
+
+import profile_clean
+import vocab
+
+DEFAULT_MIN_COUNT = 10
+DEFAULT_MIN_LENGTH = 4
+
+
+def read_profiles(in_file, clean_file=None, min_length=DEFAULT_MIN_LENGTH,
+                  corpus=None):
+    """ Cleans and tokenizes every profile in one pass.
+
+    Args:
+        in_file: Raw profiles, one per line, opened for reading text.
+        clean_file: Optional file opened for writing text; receives the
+            cleaned profiles (profiles_clean.txt).
+        min_length: Shortest word to keep, as in solution_3.py.
+        corpus: vocab.Corpus to add the profiles to; a new one if None.
+
+    Returns:
+        The vocab.Corpus of cleaned profiles.
+
+    """
+
+    corpus = corpus if corpus is not None else vocab.Corpus()
+    for block in profile_clean.iter_blocks(in_file):
+        cleaned = [profile_clean.clean_line_words(line, min_length)
+                   for line in profile_clean.block_lines(block)]
+        if clean_file is not None:
+            clean_file.write(''.join(cleaned))
+        for line in cleaned:
+            corpus.add(line.split())
+    return corpus
+
+
+def write_outputs(corpus, keep_mask, freq_file=None, counts_file=None):
+    """ Writes the frequency-filtered profiles and their term counts.
+
+    Args:
+        corpus: vocab.Corpus from read_profiles().
+        keep_mask: Boolean array over term ids, True for the terms to keep.
+        freq_file: Optional file for the filtered profiles
+            (profiles_clean_freq.txt).
+        counts_file: Optional file for the per-profile term counts
+            (profiles_term_counts.txt).
+
+    """
+
+    ids, offsets = corpus.arrays()
+    terms = np.array(corpus.vocabulary.terms, dtype=object)
+    for i in range(len(corpus)):
+        kept = ids[offsets[i]:offsets[i + 1]]
+        kept = kept[keep_mask[kept]]
+        if freq_file is not None:
+            freq_file.write(' '.join(terms[kept]) + '\n')
+        if counts_file is not None:
+            counts_file.write('----------------------------------------\n'
+                              'Profile %i term counts: \n' % (i + 1))
+            counts_file.write(''.join(
+                '%s %d\n' % pair for pair in
+                vocab.document_term_counts(kept, corpus.vocabulary)))
+
+
+def run(in_path='profiles_raw.txt', clean_path='profiles_clean.txt',
+        freq_path='profiles_clean_freq.txt',
+        counts_path='profiles_term_counts.txt', min_count=DEFAULT_MIN_COUNT,
+        min_length=DEFAULT_MIN_LENGTH):
+    """ Runs the whole of solution_3.py with a single read of in_path.
+
+    Any of the output paths can be None to skip that file.
+
+    Returns:
+        The vocab.Corpus of cleaned profiles.
+
+    """
+
+    with open(in_path, 'r') as in_file:
+        if clean_path is None:
+            corpus = read_profiles(in_file, None, min_length)
+        else:
+            with open(clean_path, 'w') as clean_file:
+                corpus = read_profiles(in_file, clean_file, min_length)
+    keep_mask = corpus.keep_mask(min_count)
+    freq_file = open(freq_path, 'w') if freq_path else None
+    counts_file = open(counts_path, 'w') if counts_path else None
+    try:
+        write_outputs(corpus, keep_mask, freq_file, counts_file)
+    finally:
+        for out_file in (freq_file, counts_file):
+            if out_file is not None:
+                out_file.close()
+    return corpus
+
+
+if __name__ == '__main__':
+
+    corpus = run()
+    print('%d profiles, %d distinct terms, %d with %d+ occurrences.'
+          % (len(corpus), len(corpus.vocabulary),
+             np.sum(corpus.keep_mask(DEFAULT_MIN_COUNT)), DEFAULT_MIN_COUNT))
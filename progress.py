@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Cheap progress indicators for long file jobs.
+
+Exercises 2.4 and 3.2 read the whole file once just to count its lines, then
+print a message for every line cleaned. On big files the printing costs more
+than the cleaning and the extra pass doubles the reading. A Progress instead:
+
+- estimates the total number of lines from the file size and the bytes read
+  so far, so no pre-pass is needed;
+- prints at most once every interval seconds, with lines/s and an ETA;
+- prints nothing but the final summary when the output is not a terminal
+  (e.g. redirected to a file), unless asked to.
+
+    with open('profiles_raw.txt', 'r') as in_file:
+        for line in track(in_file, 'profiles_raw.txt'):
+            ...
+
+"""
+
+import locale
+import os
+import sys
+import time
+
+DEFAULT_INTERVAL = 0.5
+
+
+def format_seconds(seconds):
+    """ Returns seconds as H:MM:SS. """
+    seconds = int(round(seconds))
+    return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def encoded_length(text, encoding=None):
+    """ Returns the number of bytes text takes in a file of that encoding.
+
+    ASCII text, the common case, is measured without encoding it.
+
+    Args:
+        text: str read from a text file.
+        encoding: Encoding of the file; the locale's default if None, as
+            for open().
+
+    """
+
+    if text.isascii():
+        return len(text)
+    return len(text.encode(encoding or locale.getpreferredencoding(False),
+                           'replace'))
+
+
+class Progress(object):
+    """ Rate-limited progress reporting based on bytes consumed.
+
+    Args:
+        total_bytes: Size of the input in bytes (e.g. os.path.getsize()).
+        interval: Minimum number of seconds between two reports.
+        stream: Where to report; sys.stderr by default.
+        enabled: Whether to print intermediate reports. By default only if
+            stream is a terminal.
+        label: Word used in the messages, e.g. 'cleaned'.
+
+    """
+
+    def __init__(self, total_bytes, interval=DEFAULT_INTERVAL, stream=None,
+                 enabled=None, label='processed'):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        if enabled is None:
+            enabled = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.enabled = enabled
+        self.label = label
+        self.bytes_done = 0
+        self.lines_done = 0
+        self.started = time.time()
+        self._next_report = self.started + interval
+        self._width = 0
+
+    def update(self, nbytes, nlines=1):
+        """ Records that nbytes bytes holding nlines lines were consumed.
+
+        This is called often, so it only adds and compares unless a report
+        is due.
+
+        """
+
+        self.bytes_done += nbytes
+        self.lines_done += nlines
+        if self.enabled:
+            now = time.time()
+            if now >= self._next_report:
+                self._next_report = now + self.interval
+                self.report(now)
+
+    def update_text(self, text, nlines=1, encoding=None):
+        """ Same as update(), for text read from a file of that encoding
+        (see encoded_length()).
+
+        """
+
+        self.update(encoded_length(text, encoding), nlines)
+
+    def estimated_lines(self):
+        """ Estimated total number of lines, from the bytes per line so far. """
+        if self.bytes_done == 0:
+            return 0
+        if self.bytes_done >= self.total_bytes:
+            return self.lines_done
+        return int(self.lines_done * float(self.total_bytes) /
+                   self.bytes_done)
+
+    def message(self, now=None):
+        """ Returns the progress message for the current counts. """
+        elapsed = max((now or time.time()) - self.started, 1e-9)
+        rate = self.lines_done / elapsed
+        if self.bytes_done:
+            remaining = elapsed * (self.total_bytes - self.bytes_done) / \
+                self.bytes_done
+        else:
+            remaining = 0
+        return 'Line %d/~%d %s (%.0f lines/s, ETA %s) ...' % (
+            self.lines_done, self.estimated_lines(), self.label, rate,
+            format_seconds(max(remaining, 0)))
+
+    def report(self, now=None):
+        """ Prints the progress message, overwriting it on a terminal. """
+        message = self.message(now)
+        self._width = max(self._width, len(message))
+        self.stream.write('\r' + message.ljust(self._width))
+        self.stream.flush()
+
+    def close(self):
+        """ Prints the final summary. """
+        elapsed = max(time.time() - self.started, 1e-9)
+        if self._width:
+            # Blank out the last report.
+            self.stream.write('\r' + ' ' * self._width + '\r')
+        self.stream.write('%d lines %s in %s (%.0f lines/s, %.1f MB/s).\n' % (
+            self.lines_done, self.label, format_seconds(elapsed),
+            self.lines_done / elapsed, self.bytes_done / 1e6 / elapsed))
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def track(lines, path, **kwargs):
+    """ Yields lines from a file, updating a Progress as they are consumed.
+
+    Byte counts are the encoded length of each line (see encoded_length()),
+    so that they add up to the file size even for non-ASCII text.
+
+    Args:
+        lines: Open text file (or any iterable of lines) read from path.
+        path: Path of the file, used for its size.
+        kwargs: Passed on to Progress.
+
+    """
+
+    encoding = getattr(lines, 'encoding', None)
+    with Progress(os.path.getsize(path), **kwargs) as progress:
+        update = progress.update_text
+        for line in lines:
+            update(line, 1, encoding)
+            yield line
@@ -21,20 +21,20 @@ SOLUTION TO EXERCISE 6
 """
 
 # Imports
+import os
+import sys
+
 import matplotlib.pyplot as plt
-import csv
 import numpy as np
 
-# Import the training data.
-nfile_ref = open('train.csv', 'r')
-csv_file = csv.reader(nfile_ref)   # Load the csv file.
-header = csv_file.next()           # Skip the first line as it is a header.
-data = []                          # Create a variable to hold the data.
+# titanic and titanic_groupby live in the parent directory of solutions/.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import titanic
+import titanic_groupby
 
-for row in csv_file:               # Skip through each row in the csv file,
-    data.append(row[0:])           # adding each row to the data variable.
-data = np.array(data)              # Then convert from a list to a Numpy array.
-nfile_ref.close()
+# Import the training data into typed columns.
+data = titanic.load_titanic('train.csv')
 
 # Make some magic numbers for the plot ... like:
 # The location along the x-axis where the bars will sit.
@@ -45,13 +45,10 @@ width = 0.3
 # Define the actual quanities to plot:
 # The numbers of men who died and who survived.
 # The numbers of women who died and who survived.
-men_only_stats = data[0::, 4] != "female"
-men_onboard = data[men_only_stats, 1].astype(np.float)
-men = (np.size(men_onboard) - np.sum(men_onboard), np.sum(men_onboard))
-
-women_only_stats = data[0::, 4] == "female"
-women_onboard = data[women_only_stats, 1].astype(np.float)
-women = (np.size(women_onboard)-np.sum(women_onboard), np.sum(women_onboard))
+# One group-by pass counts the passengers and survivors of both sexes.
+by_sex = titanic_groupby.groupby(data, ['Sex'])
+men = titanic_groupby.survival_counts(by_sex, 'male')
+women = titanic_groupby.survival_counts(by_sex, 'female')
 
 # Add the values to the plot.
 plt.bar(bottom_locs, men, label='Male', width=width)
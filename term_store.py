@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Incremental, persistent term counts for the profiles of Exercise 3.
+
+With solution_3.py, adding one profile means cleaning and counting the whole
+corpus again. A TermStore keeps, in a SQLite file:
+
+- every cleaned profile, with its rendered lines of profiles_clean_freq.txt
+  and profiles_term_counts.txt;
+- the global count of every term;
+- which profiles contain which term.
+
+Adding or removing a profile updates the global counts of its own terms
+only. A profile's rendered output is recomputed only if the profile is new,
+or if one of its terms crossed the frequency threshold (>= 10 by default)
+and so entered or left the keep_set. Writing the two output files then just
+concatenates the stored text:
+
+    with TermStore('profiles.db') as store:
+        store.add_profiles(open('new_profiles_raw.txt'))
+        store.export('profiles_clean_freq.txt', 'profiles_term_counts.txt')
+
+"""
+
+import collections
+import sqlite3
+
+import profile_clean
+
+DEFAULT_MIN_COUNT = 10
+DEFAULT_MIN_LENGTH = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    clean TEXT NOT NULL,
+    freq TEXT,
+    counts TEXT
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    profile INTEGER NOT NULL,
+    PRIMARY KEY (term, profile)
+) WITHOUT ROWID;
+"""
+
+
+class TermStore(object):
+    """ Persistent global and per-profile term counts.
+
+    Args:
+        path: SQLite database file; ':memory:' for a temporary store.
+        min_count: Frequency threshold of the keep_set. Fixed when the store
+            is created.
+        min_length: Shortest word kept when cleaning, as in solution_3.py.
+            Fixed when the store is created.
+
+    """
+
+    def __init__(self, path, min_count=DEFAULT_MIN_COUNT,
+                 min_length=DEFAULT_MIN_LENGTH):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+            [('min_count', min_count), ('min_length', min_length)])
+        self.connection.commit()
+        meta = dict(self.connection.execute('SELECT key, value FROM meta'))
+        self.min_count = meta['min_count']
+        self.min_length = meta['min_length']
+        # Profiles to re-render and terms whose keep status may have flipped
+        # since the last refresh().
+        self._dirty_profiles = set()
+        self._changed_terms = {}
+
+    def _count(self, term):
+        row = self.connection.execute(
+            'SELECT count FROM terms WHERE term = ?', (term,)).fetchone()
+        return row[0] if row else 0
+
+    def _update_counts(self, counts, sign):
+        """ Adds sign * counts to the global counts and notes the old counts
+        of the terms touched, to detect threshold crossings later.
+
+        """
+
+        for term, count in counts.items():
+            if term not in self._changed_terms:
+                self._changed_terms[term] = self._count(term)
+        self.connection.executemany(
+            'INSERT INTO terms (term, count) VALUES (?, ?) '
+            'ON CONFLICT (term) DO UPDATE SET count = count + excluded.count',
+            [(term, sign * count) for term, count in counts.items()])
+
+    def add_profile(self, raw_line):
+        """ Cleans and adds one raw profile. Returns its id. """
+        clean = profile_clean.clean_line_words(raw_line, self.min_length)
+        clean = clean.rstrip('\n')
+        cursor = self.connection.execute(
+            'INSERT INTO profiles (clean) VALUES (?)', (clean,))
+        profile = cursor.lastrowid
+        counts = collections.Counter(clean.split())
+        self._update_counts(counts, 1)
+        self.connection.executemany(
+            'INSERT INTO postings (term, profile) VALUES (?, ?)',
+            [(term, profile) for term in counts])
+        self._dirty_profiles.add(profile)
+        return profile
+
+    def add_profiles(self, raw_lines):
+        """ Adds raw profiles (e.g. an open file) and refreshes the outputs.
+
+        Returns:
+            The list of new profile ids.
+
+        """
+
+        profiles = [self.add_profile(line) for line in raw_lines]
+        self.refresh()
+        return profiles
+
+    def remove_profile(self, profile, refresh=True):
+        """ Removes one profile by id and refreshes the outputs. """
+        row = self.connection.execute(
+            'SELECT clean FROM profiles WHERE id = ?', (profile,)).fetchone()
+        if row is None:
+            raise KeyError('No profile with id %r.' % profile)
+        counts = collections.Counter(row[0].split())
+        self._update_counts(counts, -1)
+        # Only the terms of this profile can have dropped to zero; each is
+        # found through the primary key instead of scanning every term.
+        self.connection.executemany(
+            'DELETE FROM terms WHERE term = ? AND count <= 0',
+            [(term,) for term in counts])
+        self.connection.execute('DELETE FROM postings WHERE profile = ?',
+                                (profile,))
+        self.connection.execute('DELETE FROM profiles WHERE id = ?',
+                                (profile,))
+        self._dirty_profiles.discard(profile)
+        if refresh:
+            self.refresh()
+
+    def keep_set(self):
+        """ Returns the set of terms that occur at least min_count times. """
+        return set(term for term, in self.connection.execute(
+            'SELECT term FROM terms WHERE count >= ?', (self.min_count,)))
+
+    def _render(self, profile, clean):
+        tokens = clean.split()
+        keep = set()
+        for term in set(tokens):
+            if self._count(term) >= self.min_count:
+                keep.add(term)
+        freq_list = [word for word in tokens if word in keep]
+        counts = ''.join('%s %d\n' % pair for pair in
+                         collections.Counter(freq_list).items())
+        self.connection.execute(
+            'UPDATE profiles SET freq = ?, counts = ? WHERE id = ?',
+            (' '.join(freq_list), counts, profile))
+
+    def refresh(self):
+        """ Re-renders the profiles affected by changes since the last call.
+
+        Returns:
+            The number of profiles re-rendered.
+
+        """
+
+        flipped = [term for term, old in self._changed_terms.items()
+                   if (old >= self.min_count) !=
+                   (self._count(term) >= self.min_count)]
+        affected = set(self._dirty_profiles)
+        for term in flipped:
+            affected.update(profile for profile, in self.connection.execute(
+                'SELECT profile FROM postings WHERE term = ?', (term,)))
+        for profile in sorted(affected):
+            row = self.connection.execute(
+                'SELECT clean FROM profiles WHERE id = ?',
+                (profile,)).fetchone()
+            if row is not None:
+                self._render(profile, row[0])
+        self.connection.commit()
+        self._dirty_profiles = set()
+        self._changed_terms = {}
+        return len(affected)
+
+    def export(self, freq_path='profiles_clean_freq.txt',
+               counts_path='profiles_term_counts.txt',
+               clean_path=None):
+        """ Writes the output files of solution_3.py from the stored text.
+
+        Profiles are numbered by their position, as in solution_3.py.
+
+        """
+
+        self.refresh()
+        rows = self.connection.execute(
+            'SELECT clean, freq, counts FROM profiles ORDER BY id')
+        out_files = [open(path, 'w') if path else None
+                     for path in (clean_path, freq_path, counts_path)]
+        clean_file, freq_file, counts_file = out_files
+        try:
+            for i, (clean, freq, counts) in enumerate(rows):
+                if clean_file is not None:
+                    clean_file.write(clean + '\n')
+                if freq_file is not None:
+                    freq_file.write(freq + '\n')
+                if counts_file is not None:
+                    counts_file.write('----------------------------------------'
+                                      '\nProfile %i term counts: \n' % (i + 1))
+                    counts_file.write(counts)
+        finally:
+            for out_file in out_files:
+                if out_file is not None:
+                    out_file.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM profiles').fetchone()[0]
+
+    def close(self):
+        self.refresh()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is not None:
+            # Keep the store as it was at the last refresh(), instead of
+            # committing the profiles added before the error.
+            self.connection.rollback()
+            self.connection.close()
+        else:
+            self.close()
+
+
+if __name__ == '__main__':
+
+    with TermStore('profiles.db') as store:
+        if len(store) == 0:
+            with open('profiles_raw.txt', 'r') as in_file:
+                store.add_profiles(in_file)
+        store.export()
+        print('%d profiles, %d terms kept.' % (len(store),
+                                               len(store.keep_set())))
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Tests of crawl_frontier, on a fake clock so that no test sleeps.
+
+    python -m unittest test_crawl_frontier
+
+"""
+
+import unittest
+
+from crawl_frontier import Frontier, TokenBucket, host_key, normalize_url
+
+
+class FakeClock(object):
+    """ Clock for Frontier(clock=...) that only moves when told to. """
+
+    def __init__(self, now=0.):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def pop_all(frontier):
+    """ Returns the URLs pop() gives without waiting. """
+    urls = []
+    while True:
+        entry = frontier.pop()
+        if entry is None:
+            return urls
+        urls.append(entry.url)
+
+
+class NormalizeURLTest(unittest.TestCase):
+
+    def test_normal_form(self):
+        self.assertEqual(
+            normalize_url('HTTP://Example.COM:80/a/./b/../c?q=%7e%2f#top'),
+            'http://example.com/a/c?q=~%2F')
+        self.assertEqual(normalize_url('https://example.com:8443'),
+                         'https://example.com:8443/')
+
+    def test_relative(self):
+        self.assertEqual(
+            normalize_url('../d', base='http://example.com/a/b/c'),
+            'http://example.com/a/d')
+
+    def test_not_http(self):
+        self.assertIsNone(normalize_url('mailto:someone@example.com'))
+        self.assertIsNone(normalize_url('http://example.com:port/'))
+
+    def test_host_key(self):
+        self.assertEqual(host_key('https://example.com/a'),
+                         ('https', 'example.com', 443))
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_spacing(self):
+        bucket = TokenBucket(2., capacity=2, now=0.)
+        bucket.take(0.)
+        bucket.take(0.)
+        self.assertEqual(bucket.delay(0.), 0.5)
+        self.assertEqual(bucket.delay(0.25), 0.25)
+        self.assertEqual(bucket.delay(0.5), 0.)
+        # Tokens never pile up beyond capacity.
+        self.assertEqual(bucket.delay(100.), 0.)
+        self.assertEqual(bucket.tokens, 2.)
+
+    def test_no_limit(self):
+        bucket = TokenBucket(None)
+        for _ in range(10):
+            bucket.take(0.)
+        self.assertEqual(bucket.delay(0.), 0.)
+
+
+class FrontierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_dedup(self):
+        frontier = Frontier(clock=self.clock)
+        self.assertEqual(frontier.add('http://example.com/a#one'),
+                         'http://example.com/a')
+        self.assertIsNone(frontier.add('HTTP://EXAMPLE.com:80/b/../a#two'))
+        self.assertEqual(frontier.add_links(['/a', 'b', 'b', 'ftp://x/'], 1,
+                                            base='http://example.com/'), 1)
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual(pop_all(frontier), ['http://example.com/a',
+                                             'http://example.com/b'])
+        self.assertEqual(len(frontier), 0)
+        self.assertIsNone(frontier.wait_time())
+
+    def test_depth_limit(self):
+        frontier = Frontier(max_depth=1, clock=self.clock)
+        self.assertIsNotNone(frontier.add('http://example.com/', 0))
+        self.assertIsNotNone(frontier.add('http://example.com/1', 1))
+        self.assertIsNone(frontier.add('http://example.com/2', 2))
+        # A URL too deep once is not marked as seen.
+        self.assertNotIn('http://example.com/2', frontier.seen)
+
+    def test_breadth_first(self):
+        frontier = Frontier(max_depth=2, clock=self.clock)
+        frontier.add('http://example.com/deep', 2)
+        frontier.add('http://example.com/shallow', 1)
+        entry = frontier.pop()
+        self.assertEqual((entry.url, entry.depth),
+                         ('http://example.com/shallow', 1))
+
+    def test_max_urls(self):
+        frontier = Frontier(max_urls=2, clock=self.clock)
+        self.assertEqual(frontier.add_links(
+            ['http://example.com/%d' % i for i in range(5)], 1), 2)
+
+    def test_rate_spacing(self):
+        frontier = Frontier(rate=2., burst=1, clock=self.clock)
+        frontier.add_links(['http://example.com/%d' % i for i in range(3)], 1)
+        self.assertEqual(pop_all(frontier), ['http://example.com/0'])
+        self.assertEqual(frontier.wait_time(), 0.5)
+        self.clock.advance(0.25)
+        self.assertIsNone(frontier.pop())
+        self.assertEqual(frontier.wait_time(), 0.25)
+        self.clock.advance(0.25)
+        self.assertEqual(pop_all(frontier), ['http://example.com/1'])
+        self.clock.advance(0.5)
+        self.assertEqual(pop_all(frontier), ['http://example.com/2'])
+
+    def test_burst(self):
+        frontier = Frontier(rate=1., burst=2, clock=self.clock)
+        frontier.add_links(['http://example.com/%d' % i for i in range(3)], 1)
+        self.assertEqual(len(pop_all(frontier)), 2)
+        self.assertEqual(frontier.wait_time(), 1.)
+
+    def test_max_per_host(self):
+        frontier = Frontier(max_per_host=2, clock=self.clock)
+        frontier.add_links(['http://example.com/%d' % i for i in range(3)], 1)
+        first, second = pop_all(frontier)
+        # Saturated: nothing to wait for until a request finishes.
+        self.assertEqual(len(frontier), 1)
+        self.assertIsNone(frontier.wait_time())
+        frontier.release(first)
+        self.assertEqual(frontier.wait_time(), 0.)
+        self.assertEqual(pop_all(frontier), ['http://example.com/2'])
+        frontier.release(second)
+        frontier.release('http://example.com/2')
+        self.assertFalse(frontier._in_flight)
+
+    def test_release_keeps_rate(self):
+        frontier = Frontier(rate=1., max_per_host=1, clock=self.clock)
+        frontier.add_links(['http://example.com/0', 'http://example.com/1'],
+                           1)
+        (url,) = pop_all(frontier)
+        frontier.release(url)
+        # The slot is free, but the host still waits for its token.
+        self.assertIsNone(frontier.pop())
+        self.assertEqual(frontier.wait_time(), 1.)
+
+    def test_slow_host_does_not_block(self):
+        frontier = Frontier(rate=1., max_per_host=1, clock=self.clock)
+        frontier.add_links(['http://slow.example.com/%d' % i
+                            for i in range(3)], 1)
+        frontier.add_links(['http://fast.example.com/%d' % i
+                            for i in range(3)], 1)
+        self.assertEqual(pop_all(frontier), ['http://slow.example.com/0',
+                                             'http://fast.example.com/0'])
+        # The fast host answers every second; the slow one never does.
+        for i in (1, 2):
+            frontier.release('http://fast.example.com/%d' % (i - 1))
+            self.assertEqual(frontier.wait_time(), 1.)
+            self.clock.advance(1.)
+            self.assertEqual(pop_all(frontier),
+                             ['http://fast.example.com/%d' % i])
+        frontier.release('http://fast.example.com/2')
+        self.assertEqual(len(frontier), 2)
+        self.assertIsNone(frontier.wait_time())
+        frontier.release('http://slow.example.com/0')
+        self.assertEqual(pop_all(frontier), ['http://slow.example.com/1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Tests of async_http and crawler against a stand-in HTTP server on localhost.
+
+The server speaks just enough HTTP/1.1 for the client: keep-alive
+connections, Content-Length bodies, redirects, error statuses, a page that
+never answers in time and one whose body is cut short. It counts the
+requests in flight so the per-host limit can be checked.
+
+    python -m unittest test_crawler
+
+"""
+
+import asyncio
+import unittest
+
+import async_http
+import crawler
+
+PAGE = '<html><body><p>%s</p>%s</body></html>'
+
+# Seconds the stand-in server takes to answer /slow; far over the client
+# timeout of the tests.
+SLOW = 5.
+
+TIMEOUT = 0.5
+
+
+class StandInServer(object):
+    """ HTTP/1.1 server of a few fixed pages, for one test. """
+
+    def __init__(self):
+        self.server = None
+        self.port = None
+        self.active = 0
+        self.max_active = 0
+        self.requests = []
+        self.connections = 0
+        self._handlers = set()
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.port, path)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+                path = request_line.split()[1].decode('ascii')
+                self.requests.append(path)
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    keep_alive = await self._respond(path, writer)
+                finally:
+                    self.active -= 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(asyncio.current_task())
+
+    def _send(self, writer, status, body=b'', headers=()):
+        head = ['HTTP/1.1 %s' % status,
+                'Content-Type: text/html; charset=utf-8',
+                'Content-Length: %d' % len(body)] + list(headers)
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') +
+                     body)
+
+    async def _respond(self, path, writer):
+        """ Answers one request; returns whether to keep the connection. """
+        if path == '/start':
+            links = ''.join('<a href="%s">link</a>' % self.url(name)
+                            for name in ('/a', '/b', '/c', '/redirect',
+                                         '/missing', '/short', '/slow',
+                                         '/a'))
+            self._send(writer, '200 OK', (PAGE % ('start', links)).encode())
+        elif path in ('/a', '/b', '/c'):
+            # Long enough for the requests of a crawl to overlap.
+            await asyncio.sleep(0.05)
+            self._send(writer, '200 OK',
+                       (PAGE % ('page ' + path[1:], '')).encode())
+        elif path == '/redirect':
+            self._send(writer, '302 Found',
+                       headers=['Location: /c?from=redirect'])
+        elif path.startswith('/c?'):
+            self._send(writer, '200 OK', (PAGE % ('redirected', '')).encode())
+        elif path == '/missing':
+            self._send(writer, '404 Not Found',
+                       (PAGE % ('no such page', '')).encode())
+        elif path == '/short':
+            # Promise more than is sent, then hang up.
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 1000\r\n\r\n'
+                         b'<p>cut')
+            await writer.drain()
+            return False
+        elif path == '/slow':
+            await asyncio.sleep(SLOW)
+            self._send(writer, '200 OK', (PAGE % ('late', '')).encode())
+        else:
+            self._send(writer, '404 Not Found')
+        await writer.drain()
+        return True
+
+
+class ServerTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = StandInServer()
+        await self.server.start()
+        self.client = async_http.AsyncHTTPClient(max_connections=10,
+                                                 max_per_host=2,
+                                                 timeout=TIMEOUT)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+
+class AsyncHTTPClientTest(ServerTestCase):
+
+    async def test_connection_reuse(self):
+        for path in ('/a', '/b', '/c'):
+            response = await self.client.get(self.server.url(path))
+            self.assertEqual(response.status, 200)
+        self.assertEqual(self.client.reused, 2)
+        self.assertEqual(self.server.connections, 1)
+
+    async def test_redirect(self):
+        response = await self.client.get(self.server.url('/redirect'))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.url, self.server.url('/c?from=redirect'))
+        self.assertIn('redirected', response.text())
+
+    async def test_error_status(self):
+        response = await self.client.get(self.server.url('/missing'))
+        self.assertEqual(response.status, 404)
+
+    async def test_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.client.get(self.server.url('/slow'))
+
+    async def test_truncated_body(self):
+        with self.assertRaises(asyncio.IncompleteReadError):
+            await self.client.get(self.server.url('/short'))
+
+    async def test_per_host_limit(self):
+        responses = await asyncio.gather(*[
+            self.client.get(self.server.url(path))
+            for path in ('/a', '/b', '/c') * 3])
+        self.assertEqual([r.status for r in responses], [200] * 9)
+        self.assertEqual(self.server.max_active, 2)
+
+
+class CrawlTest(ServerTestCase):
+
+    async def test_crawl(self):
+        start, results = await crawler.crawl(self.server.url('/start'),
+                                             client=self.client)
+        self.assertEqual(start.paragraphs, ['start'])
+        by_path = dict((result.url[len(self.server.url('')):], result)
+                       for result in results)
+        # The repeated link to /a is fetched once.
+        self.assertEqual(len(results), 7)
+        self.assertEqual(by_path['/a'].paragraphs, ['page a'])
+        self.assertEqual(by_path['/redirect'].paragraphs, ['redirected'])
+        self.assertEqual(by_path['/missing'].error, 'HTTP 404 Not Found')
+        self.assertEqual(by_path['/slow'].error, 'timed out')
+        self.assertEqual(by_path['/short'].paragraphs, [])
+        self.assertIn('IncompleteReadError', by_path['/short'].error)
+        self.assertLessEqual(self.server.max_active, 2)
+        self.assertGreater(self.client.reused, 0)
+
+    async def test_error_start_page(self):
+        start, results = await crawler.crawl(self.server.url('/missing'),
+                                             client=self.client)
+        self.assertEqual(start.error, 'HTTP 404 Not Found')
+        self.assertEqual(results, [])
+        self.assertEqual(self.server.requests, ['/missing'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Columnar, typed loader for the Kaggle Titanic files (train.csv, test.csv).
+
+Exercise 5.1 appends every row to a list and converts it to an array of
+strings, so every statistic has to re-parse its column with .astype(). Here
+each column is parsed once, in a single streaming pass over the file, into
+its own NumPy array with a proper dtype:
+
+    PassengerId, SibSp, Parch  -> int
+    Survived, Pclass           -> small int
+    Age, Fare                  -> float, NaN where the field is blank
+    Sex, Embarked              -> Categorical (integer codes + labels)
+    Name, Ticket, Cabin        -> fixed width unicode strings
+
+The result is a TitanicTable (a "struct of arrays"). It can be used the same
+way as the old string array, only by column name instead of column index:
+
+    data = load_titanic('train.csv')
+    women_onboard = data['Survived'][data['Sex'] == 'female']
+    print(np.sum(women_onboard) / np.size(women_onboard))
+
+"""
+
+import collections
+import csv
+import itertools
+
+import numpy as np
+
+# Column kinds.
+INT = 'int'
+SMALL_INT = 'small_int'
+FLOAT = 'float'
+CATEGORY = 'category'
+STRING = 'string'
+
+# How every known column of train.csv/test.csv is parsed. Unknown columns are
+# kept as strings.
+COLUMN_KINDS = {
+    'PassengerId': INT,
+    'Survived': SMALL_INT,
+    'Pclass': SMALL_INT,
+    'Name': STRING,
+    'Sex': CATEGORY,
+    'Age': FLOAT,
+    'SibSp': INT,
+    'Parch': INT,
+    'Ticket': STRING,
+    'Fare': FLOAT,
+    'Cabin': STRING,
+    'Embarked': CATEGORY,
+}
+
+# Known labels for the categorical columns, so that train.csv and test.csv get
+# the same integer codes. New labels are appended as they are seen.
+CATEGORIES = {
+    'Sex': ('female', 'male'),
+    'Embarked': ('C', 'Q', 'S'),
+}
+
+# Number of rows parsed at a time while streaming.
+DEFAULT_CHUNKSIZE = 65536
+
+
+class Categorical(object):
+    """ A column of labels stored as small integer codes.
+
+    Comparing a Categorical with a label gives a boolean mask, just like
+    comparing a column of the old string array:
+
+        women_only_stats = data['Sex'] == 'female'
+
+    Missing (blank) values have the code -1.
+
+    Args:
+        codes: Integer array of codes, -1 for missing values.
+        categories: Sequence of labels; code i means categories[i].
+
+    """
+
+    def __init__(self, codes, categories):
+        self.codes = np.asarray(codes)
+        self.categories = tuple(categories)
+
+    def code_of(self, label):
+        """ Returns the code of label, or None if label never occurs. """
+        if label == '':
+            return -1
+        try:
+            return self.categories.index(label)
+        except ValueError:
+            return None
+
+    def decode(self):
+        """ Returns the column as an array of string labels. """
+        labels = np.array(self.categories + ('',))
+        return labels[self.codes]
+
+    def take(self, index):
+        """ Returns a new Categorical with only the rows in index. """
+        return Categorical(self.codes[index], self.categories)
+
+    def __eq__(self, label):
+        code = self.code_of(label)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+    def __ne__(self, label):
+        return ~(self == label)
+
+    __hash__ = None
+
+    def __getitem__(self, index):
+        if np.ndim(index) == 0 and not isinstance(index, slice):
+            code = self.codes[index]
+            return '' if code < 0 else self.categories[code]
+        return self.take(index)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __repr__(self):
+        return 'Categorical(%r, categories=%r)' % (self.codes, self.categories)
+
+
+class TitanicTable(object):
+    """ A table of named, typed column arrays of equal length.
+
+    Args:
+        columns: Ordered mapping of column name to array (or Categorical).
+
+    """
+
+    def __init__(self, columns):
+        self.columns = collections.OrderedDict(columns)
+        lengths = set(len(column) for column in self.columns.values())
+        if len(lengths) > 1:
+            raise ValueError('Columns have different lengths: %s.' %
+                             sorted(lengths))
+
+    @property
+    def names(self):
+        """ The column names, in file order. """
+        return list(self.columns)
+
+    def take(self, index):
+        """ Returns a new table with only the rows in index.
+
+        Args:
+            index: Boolean mask, integer index array or slice.
+
+        """
+        return TitanicTable((name, column.take(index)
+                             if isinstance(column, Categorical)
+                             else column[index])
+                            for name, column in self.columns.items())
+
+    @classmethod
+    def concat(cls, tables):
+        """ Stacks tables with the same columns on top of each other. """
+        tables = list(tables)
+        columns = collections.OrderedDict()
+        for name in tables[0].names:
+            parts = [table[name] for table in tables]
+            if isinstance(parts[0], Categorical):
+                # Later chunks can only have added labels, so the last
+                # chunk's categories cover all the codes.
+                columns[name] = Categorical(
+                    np.concatenate([part.codes for part in parts]),
+                    parts[-1].categories)
+            else:
+                columns[name] = np.concatenate(parts)
+        return cls(columns)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __repr__(self):
+        return 'TitanicTable(%d rows: %s)' % (len(self), ', '.join(self.names))
+
+
+def _parse_column(values, kind, categories):
+    """ Converts one column of a chunk (a tuple of strings) to an array.
+
+    Args:
+        values: Tuple of raw strings from the csv reader.
+        kind: One of the column kinds above.
+        categories: List of known labels (CATEGORY columns only); it is
+            extended in place with any new labels.
+
+    """
+
+    raw = np.array(values, dtype=str)
+    if kind == INT:
+        return raw.astype(np.int64)
+    if kind == SMALL_INT:
+        return raw.astype(np.int8)
+    if kind == FLOAT:
+        raw[raw == ''] = 'nan'
+        return raw.astype(np.float64)
+    if kind == CATEGORY:
+        # Look up each distinct label once, then map the whole chunk at once.
+        labels, inverse = np.unique(raw, return_inverse=True)
+        lookup = np.empty(len(labels), dtype=np.int16)
+        for i, label in enumerate(labels):
+            if label == '':
+                lookup[i] = -1
+                continue
+            if label not in categories:
+                categories.append(label)
+            lookup[i] = categories.index(label)
+        return Categorical(lookup[inverse.ravel()], categories)
+    return raw
+
+
+def _checked_rows(reader, width, path):
+    """ Yields the rows of a csv reader, skipping empty lines.
+
+    Raises:
+        ValueError if a row does not have width fields, which zip() would
+        otherwise silently cut every column down to.
+
+    """
+
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != width:
+            raise ValueError('Line %d of %s has %d fields, expected %d.'
+                             % (reader.line_num, path, len(row), width))
+        yield row
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+    """ Streams a Titanic csv file as a sequence of TitanicTables.
+
+    Only chunksize rows are held in memory at a time, so this works on files
+    of any size. Categorical codes are consistent across chunks.
+
+    Args:
+        path: Path of the csv file, e.g. 'train.csv'.
+        chunksize: Number of rows per chunk.
+        usecols: Optional list of column names to keep; all by default.
+
+    Raises:
+        ValueError if a row does not have as many fields as the header.
+
+    """
+
+    with open(path, 'r', newline='') as in_file:
+        reader = csv.reader(in_file)
+        header = next(reader)
+        rows = _checked_rows(reader, len(header), path)
+        keep = [(i, name) for i, name in enumerate(header)
+                if usecols is None or name in usecols]
+        categories = dict((name, list(CATEGORIES.get(name, ())))
+                          for _, name in keep)
+        while True:
+            chunk = list(itertools.islice(rows, chunksize))
+            if not chunk:
+                break
+            # zip(*chunk) turns the rows of the chunk into its columns.
+            fields = list(zip(*chunk))
+            columns = collections.OrderedDict()
+            for i, name in keep:
+                kind = COLUMN_KINDS.get(name, STRING)
+                columns[name] = _parse_column(fields[i], kind,
+                                              categories[name])
+                if kind == CATEGORY:
+                    # Freeze the labels seen so far for this chunk.
+                    column = columns[name]
+                    columns[name] = Categorical(column.codes,
+                                                tuple(categories[name]))
+            yield TitanicTable(columns)
+
+
+def load_titanic(path, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+    """ Reads a whole Titanic csv file into a TitanicTable in one pass.
+
+    Args:
+        path: Path of the csv file, e.g. 'train.csv'.
+        chunksize: Number of rows parsed at a time.
+        usecols: Optional list of column names to keep; all by default.
+
+    """
+
+    chunks = list(iter_chunks(path, chunksize=chunksize, usecols=usecols))
+    if not chunks:
+        # Header only: return empty, correctly typed columns.
+        with open(path, 'r', newline='') as in_file:
+            header = next(csv.reader(in_file))
+        return TitanicTable((name, _parse_column(
+            (), COLUMN_KINDS.get(name, STRING), list(CATEGORIES.get(name, ()))))
+            for name in header if usecols is None or name in usecols)
+    if len(chunks) == 1:
+        return chunks[0]
+    return TitanicTable.concat(chunks)
+
+
+def survival_proportion(table, mask=None):
+    """ Returns the proportion of passengers (in mask) who survived.
+
+    Args:
+        table: TitanicTable with a Survived column.
+        mask: Optional boolean mask selecting the passengers.
+
+    """
+
+    survived = table['Survived']
+    if mask is not None:
+        survived = survived[mask]
+    return np.sum(survived) / np.size(survived)
+
+
+if __name__ == '__main__':
+
+    # Exercise 5.2 and 5.3 with the columnar table.
+    data = load_titanic('train.csv')
+    print(len(data))
+    print(np.sum(data['Survived']))
+    print(survival_proportion(data))
+    print('Proportion of women who survived is %s'
+          % survival_proportion(data, data['Sex'] == 'female'))
+    print('Proportion of men who survived is %s'
+          % survival_proportion(data, data['Sex'] != 'female'))
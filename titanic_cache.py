@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Memory-mapped binary cache of parsed Titanic tables.
+
+The first time a csv file is loaded it is parsed with titanic.load_titanic()
+and every column is saved as its own .npy file, next to a small meta.json:
+
+    .titanic_cache/train.csv-<hash of the absolute path>/
+        meta.json          source path/size/mtime, column order, categories
+        PassengerId.npy
+        Survived.npy
+        ...
+
+Later loads open the .npy files with np.load(mmap_mode='r'), which only maps
+them into memory, so the cost is a few open() calls no matter how many rows
+there are. Files with the same name in different directories get
+different caches, and if the size or modification time of the csv file
+changes its cache is rebuilt automatically.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+import titanic
+
+DEFAULT_CACHE_DIR = '.titanic_cache'
+
+# Bump when the on-disk layout changes, so old caches are rebuilt.
+CACHE_VERSION = 2
+
+
+def fingerprint(path):
+    """ Returns the (size, mtime) of path that the cache is keyed on. """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def cache_path(path, cache_dir=DEFAULT_CACHE_DIR):
+    """ Returns the cache directory used for the csv file at path.
+
+    The name is the file name, for people, and a hash of its resolved
+    absolute path, so that a/train.csv and b/train.csv never share a cache
+    even when their sizes and modification times are equal.
+
+    """
+
+    real_path = os.path.realpath(path)
+    digest = hashlib.sha1(real_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, '%s-%s' % (os.path.basename(real_path),
+                                              digest))
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r') as meta_file:
+            return json.load(meta_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def is_fresh(path, cache_dir=DEFAULT_CACHE_DIR):
+    """ Returns True if a complete, up to date cache exists for path. """
+    meta = _read_meta(cache_path(path, cache_dir))
+    return (meta is not None and meta.get('version') == CACHE_VERSION and
+            meta.get('path') == os.path.realpath(path) and
+            meta.get('source') == fingerprint(path))
+
+
+def write_cache(path, cache_dir=DEFAULT_CACHE_DIR, table=None):
+    """ Parses the csv file at path and saves it as a column cache.
+
+    meta.json is written last, so a half-written cache is never used.
+
+    Args:
+        path: Path of the csv file, e.g. 'train.csv'.
+        cache_dir: Directory holding the caches of all files.
+        table: Already loaded TitanicTable for path; parsed if None.
+
+    """
+
+    source = fingerprint(path)
+    if table is None:
+        table = titanic.load_titanic(path)
+    directory = cache_path(path, cache_dir)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    categories = {}
+    for name, column in table.columns.items():
+        if isinstance(column, titanic.Categorical):
+            categories[name] = list(column.categories)
+            column = column.codes
+        np.save(os.path.join(directory, name + '.npy'), column)
+    meta = {'version': CACHE_VERSION, 'path': os.path.realpath(path),
+            'source': source, 'columns': table.names,
+            'categories': categories}
+    with open(os.path.join(directory, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file)
+    return table
+
+
+def read_cache(path, cache_dir=DEFAULT_CACHE_DIR, usecols=None):
+    """ Opens the cache of path as a TitanicTable of memory-mapped columns.
+
+    Args:
+        path: Path of the csv file the cache was made from.
+        cache_dir: Directory holding the caches of all files.
+        usecols: Optional list of column names to open; all by default.
+
+    """
+
+    directory = cache_path(path, cache_dir)
+    meta = _read_meta(directory)
+    columns = []
+    for name in meta['columns']:
+        if usecols is not None and name not in usecols:
+            continue
+        column = np.load(os.path.join(directory, name + '.npy'),
+                         mmap_mode='r')
+        if name in meta['categories']:
+            column = titanic.Categorical(column, meta['categories'][name])
+        columns.append((name, column))
+    return titanic.TitanicTable(columns)
+
+
+def load_cached(path, cache_dir=DEFAULT_CACHE_DIR, usecols=None):
+    """ Loads a Titanic csv file through the cache, (re)building it if needed.
+
+    Args:
+        path: Path of the csv file, e.g. 'train.csv'.
+        cache_dir: Directory holding the caches of all files.
+        usecols: Optional list of column names to open; all by default.
+
+    """
+
+    if not is_fresh(path, cache_dir):
+        write_cache(path, cache_dir)
+    return read_cache(path, cache_dir, usecols=usecols)
+
+
+if __name__ == '__main__':
+
+    # Build (or refresh) the caches of both files.
+    for path in ('train.csv', 'test.csv'):
+        data = load_cached(path)
+        print('%s: %r' % (path, data))
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Parallel stratified k-fold cross-validation of Titanic models.
+
+Exercise 5.4 scores the gender model on the rows it was built from, which
+says nothing about passengers it has not seen. cross_validate() splits
+train.csv into k folds with the same proportion of survivors in each, fits
+the model on k - 1 folds and scores it on the remaining one, k times, and
+reports the mean and standard deviation of the k accuracies:
+
+    results = cross_validate({'gender': titanic_models.gender_model,
+                              'lookup': titanic_models.LookupModel()},
+                             'train.csv', k=10)
+    for name, result in results.items():
+        print(name, result)
+
+The table itself is never sent to the workers, and neither are the folds
+of every task: each worker receives the fold number of every row once,
+opens the titanic_cache column files of the csv file with
+np.load(mmap_mode='r'), so all workers read the same pages of the operating
+system's file cache, and then gets tasks of only a model and a fold number.
+Of a model with a usecols attribute, like LookupModel, only those columns
+(and the target) are copied into the training and test rows of a fold.
+
+A model is either a function from a TitanicTable to 0/1 predictions, used
+as is, or an object with fit(table) like titanic_models.LookupModel, of
+which every fold fits its own copy. Models can use the derived columns of
+titanic_features, which are cached and memory-mapped the same way:
+
+    cross_validate({'title': LookupModel(['Title', 'Pclass'])},
+                   features=['Title'])
+
+"""
+
+import collections
+import copy
+import multiprocessing
+
+import numpy as np
+
+import titanic
+import titanic_cache
+import titanic_eval
+import titanic_features
+import titanic_models
+
+DEFAULT_FOLDS = 5
+
+# The memory-mapped table of a worker process and the fold of every row,
+# set by _open_table().
+_table = None
+_folds = None
+
+
+def stratified_folds(target, k=DEFAULT_FOLDS, seed=0):
+    """ Returns the fold number, from 0 to k - 1, of every row.
+
+    The rows of each class are shuffled and dealt out to the folds in turn,
+    so fold sizes and class counts differ by at most one between folds.
+
+    Args:
+        target: Array of class labels, e.g. the Survived column.
+        k: Number of folds.
+        seed: Seed of the shuffle; the same seed gives the same folds.
+
+    """
+
+    target = np.asarray(target)
+    if not 2 <= k <= len(target):
+        raise ValueError('Cannot make %d folds of %d rows.' % (k, len(target)))
+    order = np.random.RandomState(seed).permutation(len(target))
+    # A stable sort keeps the shuffled order within each class.
+    order = order[np.argsort(target[order], kind='stable')]
+    folds = np.empty(len(target), dtype=np.intp)
+    folds[order] = np.arange(len(target)) % k
+    return folds
+
+
+def fold_indices(folds, fold):
+    """ Returns the (training rows, test rows) index arrays of one fold. """
+    test = folds == fold
+    return np.flatnonzero(~test), np.flatnonzero(test)
+
+
+class CrossValidation(object):
+    """ Scores of one model on every fold.
+
+    Attributes:
+        accuracies: Accuracy on each test fold, in fold order.
+        confusion: Confusion matrix summed over the test folds, i.e. of the
+            out-of-fold prediction of every row.
+
+    """
+
+    def __init__(self, accuracies, confusion):
+        self.accuracies = np.asarray(accuracies)
+        self.confusion = confusion
+
+    @property
+    def mean(self):
+        """ Mean accuracy over the folds. """
+        return np.mean(self.accuracies)
+
+    @property
+    def std(self):
+        """ Sample standard deviation of the fold accuracies. """
+        return np.std(self.accuracies, ddof=1)
+
+    def __str__(self):
+        return ('Cross-validated accuracy is %.4f +/- %.4f over %d folds'
+                % (self.mean, self.std, len(self.accuracies)))
+
+
+def _open_table(path, cache_dir, usecols, keys, folds):
+    """ Process pool initializer: maps the cached table into memory and
+    keeps the folds, which are sent once per worker instead of per task.
+
+    The caches were built by cross_validate() beforehand; workers only open
+    them read-only, with the keys of the derived columns the parent used,
+    so they never rebuild (or see half-rebuilt) caches.
+
+    """
+
+    global _table, _folds
+    _folds = folds
+    if keys:
+        _table = titanic_features.read_features(path, keys, cache_dir)
+    else:
+        _table = titanic_cache.read_cache(path, cache_dir, usecols=usecols)
+
+
+def _model_columns(model, target):
+    """ Returns the worker's table cut down to the columns model uses, or
+    the whole table if the model does not say which it uses.
+
+    """
+
+    usecols = getattr(model, 'usecols', None)
+    if usecols is None:
+        return _table
+    names = set(usecols) | set([target])
+    return titanic.TitanicTable((name, column)
+                                for name, column in _table.columns.items()
+                                if name in names)
+
+
+def score_fold(task):
+    """ Fits and scores one model on one fold of the worker's table.
+
+    This is the unit of work of the process pool.
+
+    Args:
+        task: (name, model, fold, target column).
+
+    Returns:
+        (name, fold, titanic_eval.Evaluation).
+
+    """
+
+    name, model, fold, target = task
+    train, test = fold_indices(_folds, fold)
+    table = _model_columns(model, target)
+    if hasattr(model, 'fit'):
+        # Never fit the caller's model, even when running in-process.
+        model = copy.deepcopy(model).fit(table.take(train), target)
+    return name, fold, titanic_eval.evaluate(model, table.take(test), target)
+
+
+def cross_validate(models, path='train.csv', k=DEFAULT_FOLDS, seed=0,
+                   target='Survived', processes=None,
+                   cache_dir=titanic_cache.DEFAULT_CACHE_DIR, usecols=None,
+                   features=None):
+    """ Cross-validates several models on the same stratified folds.
+
+    Args:
+        models: Dictionary of names to models (see the module docstring).
+        path: Path of the csv file to cross-validate on.
+        k: Number of folds.
+        seed: Seed of the fold assignment.
+        target: Name of the 0/1 target column.
+        processes: Number of worker processes; one per CPU if None. With 1
+            everything runs in this process.
+        cache_dir: Directory of the titanic_cache column files.
+        usecols: Optional list of the columns the models need; all by
+            default. Opening a column only maps it, so this hardly matters.
+        features: Optional list of titanic_features columns the models
+            need; with features, all source columns are opened.
+
+    Returns:
+        Ordered dictionary of names to CrossValidation, in models order.
+
+    """
+
+    if usecols is not None:
+        usecols = set(usecols) | set([target])
+    # Build the caches once here, so the workers only have to open them.
+    keys = None
+    if features:
+        keys = titanic_features.feature_keys(path, features)
+        table = titanic_features.load_features(path, features, cache_dir)
+    else:
+        table = titanic_cache.load_cached(path, cache_dir, usecols=usecols)
+    folds = stratified_folds(table[target], k, seed)
+    tasks = [(name, model, fold, target)
+             for name, model in models.items() for fold in range(k)]
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1:
+        _open_table(path, cache_dir, usecols, keys, folds)
+        scores = [score_fold(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(min(processes, len(tasks)),
+                                    initializer=_open_table,
+                                    initargs=(path, cache_dir, usecols, keys,
+                                              folds))
+        try:
+            scores = pool.map(score_fold, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    by_model = collections.defaultdict(list)
+    for name, fold, evaluation in scores:
+        by_model[name].append(evaluation)
+    return collections.OrderedDict(
+        (name, CrossValidation([e.accuracy for e in by_model[name]],
+                               sum(e.confusion for e in by_model[name])))
+        for name in models)
+
+
+if __name__ == '__main__':
+
+    # Exercise 5.4, on passengers each model has not seen: the gender model
+    # against lookup tables of increasing detail.
+    models = collections.OrderedDict([
+        ('gender', titanic_models.gender_model),
+        ('sex and class', titanic_models.LookupModel(['Sex', 'Pclass'])),
+        ('lookup', titanic_models.LookupModel()),
+        ('lookup, 5+ per cell', titanic_models.LookupModel(min_count=5)),
+        ('title and class', titanic_models.LookupModel(['Title', 'Pclass']))])
+    results = cross_validate(models, 'train.csv', k=10, features=['Title'])
+    for name, result in results.items():
+        print('%-20s %s' % (name, result))
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Vectorized evaluation of Titanic models against the Survived column.
+
+Exercise 5.4 builds the training predictions with a list comprehension over
+every row index. Here the model predicts all rows at once (see
+titanic_models) and the scores are computed with array operations only:
+
+    result = evaluate(titanic_models.gender_model, data, by=['Sex'])
+    print(result.accuracy)
+    print(result.confusion)
+    print(result.by_group)
+
+"""
+
+import numpy as np
+
+import titanic
+import titanic_groupby
+import titanic_models
+
+
+def confusion_matrix(target, predictions):
+    """ Returns the 2x2 confusion matrix of 0/1 targets and predictions.
+
+    Rows are the true class, columns the predicted class:
+
+        [[true negatives,  false positives],
+         [false negatives, true positives]]
+
+    """
+
+    target = np.asarray(target, dtype=np.intp)
+    predictions = np.asarray(predictions, dtype=np.intp)
+    return np.bincount(2 * target + predictions, minlength=4).reshape(2, 2)
+
+
+class Evaluation(object):
+    """ Scores of one model on one table.
+
+    Attributes:
+        accuracy: Proportion of correct predictions.
+        confusion: 2x2 confusion matrix, see confusion_matrix().
+        by_group: GroupResult whose rate is the accuracy in each group of
+            the requested key columns, or None.
+
+    """
+
+    def __init__(self, confusion, by_group=None):
+        self.confusion = confusion
+        self.by_group = by_group
+        self.accuracy = np.trace(confusion) / np.sum(confusion)
+
+    @property
+    def precision(self):
+        """ Proportion of predicted survivors who survived. """
+        return self.confusion[1, 1] / np.sum(self.confusion[:, 1])
+
+    @property
+    def recall(self):
+        """ Proportion of survivors who were predicted to survive. """
+        return self.confusion[1, 1] / np.sum(self.confusion[1, :])
+
+    def __str__(self):
+        lines = ['Training correct classification rate is %s' % self.accuracy,
+                 'Confusion matrix (rows: true 0/1, columns: predicted 0/1):',
+                 str(self.confusion)]
+        if self.by_group is not None:
+            lines.append(str(self.by_group))
+        return '\n'.join(lines)
+
+
+def evaluate(model, table, target='Survived', by=None):
+    """ Scores model on table without any per-row Python work.
+
+    Args:
+        model: Function from a TitanicTable to an array of 0/1 predictions.
+        table: TitanicTable with a target column.
+        target: Name of the 0/1 target column.
+        by: Optional list of key columns (see titanic_groupby.groupby) to
+            report the accuracy of each group.
+
+    """
+
+    predictions = np.asarray(model(table))
+    truth = np.asarray(table[target])
+    by_group = None
+    if by:
+        by_group = titanic_groupby.groupby(table, by,
+                                           value=predictions == truth)
+    return Evaluation(confusion_matrix(truth, predictions), by_group)
+
+
+def everyone_dies(table):
+    """ Baseline model: predicts that nobody survives. """
+    return np.zeros(len(table), dtype=np.int8)
+
+
+if __name__ == '__main__':
+
+    # Exercise 5.4: training accuracy of the gender model ...
+    data = titanic.load_titanic('train.csv')
+    print(evaluate(titanic_models.gender_model, data, by=['Sex', 'Pclass']))
+
+    # ... is higher than predicting everyone dies.
+    print(evaluate(everyone_dies, data))
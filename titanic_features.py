@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Derived Titanic features, computed with whole-column operations and cached
+on disk.
+
+The exercises never use Name, Ticket or Cabin, and skip passengers without
+an Age. These columns hold more than they show:
+
+    Title         'Mr', 'Mrs', 'Miss', 'Master' or 'Rare', from
+                  'Braund, Mr. Owen Harris'
+    Deck          first letter of Cabin, missing for most passengers
+    TicketPrefix  letters before the ticket number, e.g. 'A5' for
+                  'A/5 21171', missing for plain numbers
+    FamilySize    SibSp + Parch + 1
+    AgeImputed    Age, or the median Age of passengers of the same Title in
+                  the same file where Age is blank
+
+Every feature is computed for all rows at once with np.char and array
+operations; no Python code runs per passenger. load_features() adds them to
+the titanic_cache table of a csv file and saves each one next to the cache:
+
+    .titanic_cache/train.csv-<hash>/features/
+        Title.npy, Title.json     values, and the key they were made with
+        ...
+
+The key of a column is the size and modification time of the csv file and
+the version of its transform (and of the transforms it uses), so a later
+load only maps the saved columns into memory, and only a changed file or
+transform is computed again:
+
+    data = load_features('train.csv')
+    model = titanic_models.LookupModel(['Sex', 'Title', 'Pclass']).fit(data)
+
+"""
+
+import collections
+import json
+import os
+
+import numpy as np
+
+import titanic
+import titanic_cache
+import titanic_models
+
+TITLES = ('Mr', 'Mrs', 'Miss', 'Master', 'Rare')
+
+# Spellings of the common titles; every other title becomes 'Rare'.
+TITLE_ALIASES = {'Mlle': 'Miss', 'Ms': 'Miss', 'Mme': 'Mrs'}
+
+DECKS = ('A', 'B', 'C', 'D', 'E', 'F', 'G', 'T')
+
+# How a feature is made: function(table) -> column, the version of that
+# function, and the columns it reads (source or derived).
+Feature = collections.namedtuple('Feature', ['function', 'version',
+                                             'columns'])
+
+
+def _categorical(values, categories):
+    """ Returns a Categorical of the string values; values outside
+    categories, or blank, are missing.
+
+    """
+
+    codes = np.full(len(values), -1, dtype=np.int16)
+    for code, label in enumerate(categories):
+        codes[values == label] = code
+    return titanic.Categorical(codes, categories)
+
+
+def title(table):
+    """ Returns the title in every Name, as a Categorical of TITLES.
+
+    Names are written 'Surname, Title. Given names'.
+
+    """
+
+    after_comma = np.char.partition(np.asarray(table['Name']), ',')[:, 2]
+    titles = np.char.strip(np.char.partition(after_comma, '.')[:, 0])
+    column = _categorical(titles, TITLES)
+    for alias, label in TITLE_ALIASES.items():
+        column.codes[titles == alias] = TITLES.index(label)
+    column.codes[column.codes < 0] = TITLES.index('Rare')
+    return column
+
+
+def deck(table):
+    """ Returns the deck letter of every Cabin, as a Categorical of DECKS.
+    """
+
+    return _categorical(np.asarray(table['Cabin']).astype('U1'), DECKS)
+
+
+def ticket_prefix(table):
+    """ Returns the letters before the number of every Ticket, upper case
+    and without '.', '/' or spaces, as a Categorical of the prefixes found.
+
+    """
+
+    head, _, number = np.char.rpartition(np.asarray(table['Ticket']),
+                                         ' ').T
+    # A ticket without a number, e.g. 'LINE', is all prefix.
+    head = np.where((head == '') & ~np.char.isdigit(number), number, head)
+    for character in './ ':
+        head = np.char.replace(head, character, '')
+    head = np.char.upper(head)
+    return _categorical(head, np.unique(head[head != '']).tolist())
+
+
+def family_size(table):
+    """ Returns the number of family members aboard, the passenger included.
+    """
+
+    return np.asarray(table['SibSp']) + np.asarray(table['Parch']) + 1
+
+
+def impute_age(table):
+    """ Returns Age with blanks filled with the median Age of the other
+    passengers with the same Title, or of everybody if they have none.
+
+    """
+
+    age = np.array(table['Age'], dtype=np.float64)
+    titles = table['Title']
+    missing = np.isnan(age)
+    overall = np.nanmedian(age) if not missing.all() else np.nan
+    for code in range(len(titles.categories)):
+        group = titles.codes == code
+        known = age[group & ~missing]
+        age[group & missing] = np.median(known) if len(known) else overall
+    age[np.isnan(age)] = overall
+    return age
+
+
+FEATURES = collections.OrderedDict([
+    ('Title', Feature(title, 1, ('Name',))),
+    ('Deck', Feature(deck, 1, ('Cabin',))),
+    ('TicketPrefix', Feature(ticket_prefix, 1, ('Ticket',))),
+    ('FamilySize', Feature(family_size, 1, ('SibSp', 'Parch'))),
+    ('AgeImputed', Feature(impute_age, 1, ('Age', 'Title'))),
+])
+
+
+def requirements(names):
+    """ Returns names with the derived columns they read, each after the
+    ones it reads.
+
+    """
+
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name not in FEATURES:
+            raise KeyError('Unknown feature %r.' % name)
+        for column in FEATURES[name].columns:
+            if column in FEATURES:
+                visit(column)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def _versions(name):
+    """ Returns the [name, version] of a feature and of every feature it
+    reads, which all go into its cache key.
+
+    """
+
+    return [[required, FEATURES[required].version]
+            for required in requirements([name])]
+
+
+def derive(table, names=None):
+    """ Returns table with the derived columns names (all by default), and
+    those they read, added. Nothing is cached.
+
+    """
+
+    columns = collections.OrderedDict(table.columns)
+    for name in requirements(FEATURES if names is None else names):
+        columns[name] = FEATURES[name].function(titanic.TitanicTable(columns))
+    return titanic.TitanicTable(columns)
+
+
+def feature_path(path, cache_dir=titanic_cache.DEFAULT_CACHE_DIR):
+    """ Returns the directory of the derived columns of the csv file at path.
+    """
+
+    return os.path.join(titanic_cache.cache_path(path, cache_dir), 'features')
+
+
+def _read_feature(directory, name, key):
+    """ Opens a saved column made with key, memory-mapped; None if there is
+    no such column.
+
+    """
+
+    try:
+        with open(os.path.join(directory, name + '.json'), 'r') as meta_file:
+            meta = json.load(meta_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get('key') != key:
+        return None
+    column = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+    if meta.get('categories') is not None:
+        column = titanic.Categorical(column, meta['categories'])
+    return column
+
+
+def _write_feature(directory, name, key, column):
+    """ Saves a column; the .json file is written last, so a half-written
+    column is never used.
+
+    """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    categories = None
+    if isinstance(column, titanic.Categorical):
+        categories = list(column.categories)
+        column = column.codes
+    np.save(os.path.join(directory, name + '.npy'), column)
+    with open(os.path.join(directory, name + '.json'), 'w') as meta_file:
+        json.dump({'key': key, 'categories': categories}, meta_file)
+
+
+def feature_keys(path, names=None):
+    """ Returns the cache key of each derived column of path that names
+    (all by default) need, in the order they are computed.
+
+    """
+
+    source = titanic_cache.fingerprint(path)
+    return collections.OrderedDict(
+        (name, {'source': source, 'versions': _versions(name)})
+        for name in requirements(FEATURES if names is None else names))
+
+
+def read_features(path, keys, cache_dir=titanic_cache.DEFAULT_CACHE_DIR):
+    """ Opens the caches of path that load_features() built, read-only.
+
+    Nothing is computed or written, so many processes can open the same
+    caches at once, e.g. the workers of titanic_cv.
+
+    Args:
+        path: Path of the csv file.
+        keys: Derived columns to open and their keys, from feature_keys().
+        cache_dir: Directory holding the caches of all files.
+
+    Raises:
+        IOError if a column was not saved with its key.
+
+    """
+
+    table = titanic_cache.read_cache(path, cache_dir)
+    directory = feature_path(path, cache_dir)
+    columns = collections.OrderedDict(table.columns)
+    for name, key in keys.items():
+        column = _read_feature(directory, name, key)
+        if column is None:
+            raise IOError('No cached %s column of %s with key %r.'
+                          % (name, path, key))
+        columns[name] = column
+    return titanic.TitanicTable(columns)
+
+
+def load_features(path, names=None, cache_dir=titanic_cache.DEFAULT_CACHE_DIR):
+    """ Loads a Titanic csv file through the cache, with derived columns.
+
+    Args:
+        path: Path of the csv file, e.g. 'train.csv'.
+        names: Derived columns to add (see FEATURES); all by default. The
+            derived columns they read are added as well.
+        cache_dir: Directory holding the caches of all files.
+
+    Returns:
+        TitanicTable of the source columns followed by the derived ones,
+        all memory-mapped except those computed by this call.
+
+    """
+
+    # Rebuilding the source cache removes its derived columns too.
+    table = titanic_cache.load_cached(path, cache_dir)
+    directory = feature_path(path, cache_dir)
+    columns = collections.OrderedDict(table.columns)
+    for name, key in feature_keys(path, names).items():
+        column = _read_feature(directory, name, key)
+        if column is None:
+            column = FEATURES[name].function(titanic.TitanicTable(columns))
+            _write_feature(directory, name, key, column)
+        columns[name] = column
+    return titanic.TitanicTable(columns)
+
+
+if __name__ == '__main__':
+
+    import titanic_groupby
+
+    # Survival by title: the rule of Exercise 5.4 is mostly a rule about
+    # 'Mr'.
+    train = load_features('train.csv')
+    print(titanic_groupby.groupby(train, ['Title']))
+    print('%d of %d ages were imputed.'
+          % (np.sum(np.isnan(train['Age'])), len(train)))
+
+    # Title tells boys ('Master') from men, which Sex alone cannot.
+    model = titanic_models.LookupModel(
+        ['Title', 'Pclass', ('FamilyBin', 'FamilySize', (1, 2, 5, np.inf))])
+    model.fit(train)
+    print('Training accuracy of the title model is %s'
+          % np.mean(model(train) == train['Survived']))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Single-pass group-by aggregation over a TitanicTable.
+
+Exercise 5.3 builds one boolean mask per group, indexes the data once per
+mask and sums each slice, so every new breakdown is another scan. Here every
+key column is turned into small integer level codes, the codes of all keys
+are combined into one group code per row, and np.bincount() counts and sums
+every group at once:
+
+    result = groupby(data, ['Sex', 'Pclass'])
+    for group, count, rate in zip(result.groups, result.count, result.rate):
+        print(group, count, rate)
+
+Age (or any float column) can be used as a key by binning it first with
+bin_column().
+
+"""
+
+import numpy as np
+
+import titanic
+
+# Age bins used by the Titanic examples.
+AGE_EDGES = (0, 12, 18, 30, 50, 65, np.inf)
+
+
+def bin_column(values, edges, labels=None):
+    """ Cuts a numeric column into bins and returns it as a Categorical.
+
+    Bin i holds edges[i] <= value < edges[i + 1]. NaN values and values
+    outside the edges are missing (code -1).
+
+    Args:
+        values: Numeric array, e.g. data['Age'].
+        edges: Increasing bin edges.
+        labels: Optional bin labels; '[lo, hi)' strings by default.
+
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    if labels is None:
+        labels = ['[%g, %g)' % (lo, hi) for lo, hi in zip(edges[:-1],
+                                                          edges[1:])]
+    codes = np.searchsorted(edges, values, side='right') - 1
+    # NaN sorts after every edge, so it lands in the last "bin" as well.
+    codes[(codes < 0) | (codes >= len(edges) - 1) | np.isnan(values)] = -1
+    return titanic.Categorical(codes.astype(np.int16), labels)
+
+
+def _levels(column):
+    """ Returns (level codes, level labels) for a key column.
+
+    Missing categorical values get their own level, labelled None.
+
+    """
+
+    if isinstance(column, titanic.Categorical):
+        labels = list(column.categories) + [None]
+        codes = np.where(column.codes < 0, len(labels) - 1, column.codes)
+        return codes.astype(np.intp), labels
+    column = np.asarray(column)
+    if column.dtype.kind in 'iub' and len(column):
+        # Small integer keys (Pclass, SibSp ...) are offset directly, which
+        # avoids sorting.
+        low = int(column.min())
+        high = int(column.max())
+        if high - low < 1024:
+            present = np.bincount(column - low, minlength=high - low + 1) > 0
+            lookup = np.cumsum(present) - 1
+            labels = [low + i for i in np.flatnonzero(present)]
+            return lookup[column - low].astype(np.intp), labels
+    labels, codes = np.unique(column, return_inverse=True)
+    return codes.ravel().astype(np.intp), labels.tolist()
+
+
+def group_codes(table, keys):
+    """ Combines the key columns of table into one integer code per row.
+
+    Args:
+        table: TitanicTable.
+        keys: List of column names or (name, column) pairs, the latter for
+            derived keys such as ('AgeBin', bin_column(...)).
+
+    Returns:
+        (codes, shape, labels): the group code of every row, the number of
+        levels of each key, and the list of level labels of each key.
+
+    """
+
+    codes = np.zeros(len(table), dtype=np.intp)
+    shape = []
+    labels = []
+    for key in keys:
+        column = table[key] if isinstance(key, str) else key[1]
+        key_codes, key_labels = _levels(column)
+        # Mixed radix: code = ((k0 * n1 + k1) * n2 + k2) ...
+        codes *= len(key_labels)
+        codes += key_codes
+        shape.append(len(key_labels))
+        labels.append(key_labels)
+    return codes, tuple(shape), labels
+
+
+class GroupResult(object):
+    """ Counts, sums and rates of a value column for every non-empty group.
+
+    Attributes:
+        keys: Names of the key columns.
+        groups: List of tuples of key labels, one per group.
+        count: Number of rows in each group.
+        sum: Sum of the value column in each group.
+        rate: sum / count for each group, e.g. the survival rate.
+
+    """
+
+    def __init__(self, keys, groups, count, sum_):
+        self.keys = keys
+        self.groups = groups
+        self.count = count
+        self.sum = sum_
+        self.rate = sum_ / count
+
+    def get(self, *group):
+        """ Returns (count, sum, rate) for one group, e.g. get('female', 1). """
+        i = self.groups.index(tuple(group))
+        return self.count[i], self.sum[i], self.rate[i]
+
+    def __iter__(self):
+        return iter(zip(self.groups, self.count, self.sum, self.rate))
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __str__(self):
+        lines = ['\t'.join(self.keys + ['count', 'sum', 'rate'])]
+        for group, count, sum_, rate in self:
+            lines.append('\t'.join([str(label) for label in group] +
+                                   ['%d' % count, '%g' % sum_, '%.4f' % rate]))
+        return '\n'.join(lines)
+
+
+def groupby(table, keys, value='Survived'):
+    """ Counts rows and sums value for every combination of key levels.
+
+    The whole table is read once: np.bincount() accumulates the counts and
+    the sums of all groups at the same time.
+
+    Args:
+        table: TitanicTable.
+        keys: List of column names or (name, column) pairs, see group_codes.
+        value: Name of the column to sum (or an array); Survived by default.
+
+    """
+
+    codes, shape, labels = group_codes(table, keys)
+    ngroups = int(np.prod(shape)) if shape else 1
+    values = table[value] if isinstance(value, str) else value
+    count = np.bincount(codes, minlength=ngroups)
+    sum_ = np.bincount(codes, weights=np.asarray(values, dtype=np.float64),
+                       minlength=ngroups)
+    present = np.flatnonzero(count)
+    groups = [tuple(labels[k][i] for k, i in
+                    enumerate(np.unravel_index(code, shape)))
+              for code in present]
+    names = [key if isinstance(key, str) else key[0] for key in keys]
+    return GroupResult(names, groups, count[present], sum_[present])
+
+
+def survival_counts(result, *group):
+    """ Returns (died, survived) for one group, the bar chart inputs. """
+    count, survived, _ = result.get(*group)
+    return count - survived, survived
+
+
+if __name__ == '__main__':
+
+    data = titanic.load_titanic('train.csv')
+
+    # Exercise 5.3 from one pass over the data.
+    by_sex = groupby(data, ['Sex'])
+    print('Proportion of women who survived is %s' % by_sex.get('female')[2])
+    print('Proportion of men who survived is %s' % by_sex.get('male')[2])
+
+    # Other breakdowns cost one pass each as well.
+    print(groupby(data, ['Sex', 'Pclass']))
+    print(groupby(data, ['Embarked']))
+    print(groupby(data, [('AgeBin', bin_column(data['Age'], AGE_EDGES))]))
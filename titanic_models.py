@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Vectorized Titanic models and chunked scoring of large passenger files.
+
+gendermodel.py and Exercise 5.5 test row[3] == 'female' and call writerow()
+once per passenger. Here a model is any function that takes a TitanicTable
+and returns an integer array of predictions for all its rows at once, and
+score_csv() streams the input in fixed-size chunks, predicts a whole chunk
+with array comparisons and writes it with one bulk write. Memory use depends
+on the chunk size only, not on the size of the input.
+
+Richer rules do not need more if branches either. A LookupModel learns the
+survival rate of every cell of a few key columns, e.g. (Sex, Pclass, fare
+bin, age bin), in one group-by pass over train.csv, and compiles it into a
+table of 0/1 predictions indexed by cell code. Scoring turns the keys of
+every row into its integer cell code and gathers the predictions with one
+array index, however many cells there are:
+
+    model = LookupModel().fit(titanic.load_titanic('train.csv'))
+    score_csv(model, 'test.csv', 'lookupmodel.csv', usecols=model.usecols)
+
+"""
+
+import numpy as np
+
+import titanic
+import titanic_groupby
+
+# Fare bins of the Kaggle tutorial: 0-9, 10-19, 20-29 and 30 or more.
+FARE_EDGES = (0, 10, 20, 30, np.inf)
+
+# Keys of the default LookupModel: column names, or (name, column, edges)
+# for a numeric column cut into bins.
+DEFAULT_KEYS = ('Sex', 'Pclass', ('FareBin', 'Fare', FARE_EDGES),
+                ('AgeBin', 'Age', titanic_groupby.AGE_EDGES))
+
+
+def gender_model(table):
+    """ Predicts that women survive (1) and men do not (0).
+
+    Args:
+        table: TitanicTable with a Sex column.
+
+    """
+
+    return (table['Sex'] == 'female').astype(np.int8)
+
+
+# The columns gender_model reads, like LookupModel.usecols.
+gender_model.usecols = ['Sex']
+
+
+def _encode(column, labels):
+    """ Returns the index of every value of column in the level labels of a
+    fitted key, -1 for values not seen when fitting.
+
+    """
+
+    if isinstance(column, titanic.Categorical):
+        # Fitted labels are categories followed by None (missing values).
+        lookup = np.array([labels.index(label) if label in labels else -1
+                           for label in column.categories] +
+                          [labels.index(None)], dtype=np.intp)
+        return lookup[column.codes]
+    values = np.asarray(column)
+    known = np.asarray(labels)
+    index = np.clip(np.searchsorted(known, values), 0, len(known) - 1)
+    return np.where(known[index] == values, index, -1)
+
+
+class LookupModel(object):
+    """ Survival rule compiled into a lookup table over cells of key columns.
+
+    A cell predicts survival if at least threshold of its training
+    passengers survived. Cells with fewer than min_count training passengers
+    use the prediction of the cell one key coarser (e.g. (Sex, Pclass,
+    FareBin) for a sparse (Sex, Pclass, FareBin, AgeBin) cell), and so on
+    down to the overall survival rate.
+
+    Args:
+        keys: Column names, or (name, column, edges) tuples for numeric
+            columns cut into bins with titanic_groupby.bin_column().
+        threshold: Survival rate from which a cell predicts survival.
+        min_count: Fewest training passengers a cell needs to be used.
+
+    Attributes:
+        count: Number of training passengers in every cell, one axis per
+            key, set by fit().
+        survived: Number of those who survived.
+        predictions: 0/1 prediction of every cell.
+        default: Prediction for rows with a key value never seen in
+            training.
+
+    """
+
+    def __init__(self, keys=DEFAULT_KEYS, threshold=0.5, min_count=1):
+        self.keys = list(keys)
+        self.threshold = threshold
+        self.min_count = min_count
+        self.labels = None
+        self.count = None
+        self.survived = None
+        self.predictions = None
+        self.default = None
+
+    @property
+    def usecols(self):
+        """ The columns of the passenger file that the keys are made from. """
+        return [key if isinstance(key, str) else key[1] for key in self.keys]
+
+    def _key_columns(self, table):
+        """ Returns the keys for titanic_groupby.group_codes(). """
+        columns = []
+        for key in self.keys:
+            if isinstance(key, str):
+                columns.append(key)
+            else:
+                name, column, edges = key
+                columns.append((name, titanic_groupby.bin_column(
+                    table[column], edges)))
+        return columns
+
+    def fit(self, table, target='Survived'):
+        """ Learns the survival rate of every cell in one pass over table.
+
+        Returns:
+            self, so that model = LookupModel().fit(data) works.
+
+        """
+
+        codes, shape, self.labels = titanic_groupby.group_codes(
+            table, self._key_columns(table))
+        size = int(np.prod(shape))
+        self.count = np.bincount(codes, minlength=size).reshape(shape)
+        self.survived = np.bincount(
+            codes, weights=np.asarray(table[target], dtype=np.float64),
+            minlength=size).reshape(shape)
+        self.default, self.predictions = self._compile(self.count,
+                                                       self.survived)
+        return self
+
+    def _compile(self, count, survived):
+        """ Returns (overall prediction, prediction of every cell). Only the
+        per-cell counts are used, the training rows are not read again.
+
+        """
+
+        shape = count.shape
+        default = np.int8(survived.sum() >= self.threshold * count.sum())
+        predictions = default
+        for depth in range(1, len(shape) + 1):
+            # Totals of the cells of the first depth keys.
+            cells = shape[:depth]
+            level_count = count.reshape(cells + (-1,)).sum(axis=-1)
+            level_survived = survived.reshape(cells + (-1,)).sum(axis=-1)
+            use = level_count >= max(self.min_count, 1)
+            rate = level_survived / np.where(use, level_count, 1)
+            predictions = np.where(use, rate >= self.threshold,
+                                   predictions[..., np.newaxis]
+                                   if depth > 1 else predictions)
+            predictions = predictions.astype(np.int8)
+        return default, predictions
+
+    def cell_codes(self, table):
+        """ Returns the cell code of every row of table, -1 for rows with a
+        key value never seen in training.
+
+        """
+
+        codes = np.zeros(len(table), dtype=np.intp)
+        unknown = np.zeros(len(table), dtype=bool)
+        for key, labels in zip(self._key_columns(table), self.labels):
+            column = table[key] if isinstance(key, str) else key[1]
+            key_codes = _encode(column, labels)
+            unknown |= key_codes < 0
+            codes *= len(labels)
+            codes += key_codes
+        codes[unknown] = -1
+        return codes
+
+    def predict(self, table):
+        """ Predicts every row of table with one gather from the table. """
+        codes = self.cell_codes(table)
+        predictions = self.predictions.ravel()[np.maximum(codes, 0)]
+        predictions[codes < 0] = self.default
+        return predictions
+
+    __call__ = predict
+
+    def __str__(self):
+        names = [key if isinstance(key, str) else key[0] for key in self.keys]
+        lines = ['\t'.join(names + ['count', 'rate', 'prediction'])]
+        for cell in zip(*np.nonzero(self.count)):
+            lines.append('\t'.join(
+                [str(self.labels[k][i]) for k, i in enumerate(cell)] +
+                ['%d' % self.count[cell],
+                 '%.4f' % (self.survived[cell] / self.count[cell]),
+                 '%d' % self.predictions[cell]]))
+        return '\n'.join(lines)
+
+
+def format_predictions(passenger_ids, predictions):
+    """ Returns the csv lines for a chunk of predictions as one string.
+
+    Args:
+        passenger_ids: Integer array of passenger ids.
+        predictions: Integer array of 0/1 predictions.
+
+    """
+
+    if len(passenger_ids) == 0:
+        return ''
+    lines = np.char.add(np.char.add(passenger_ids.astype(str), ','),
+                        np.asarray(predictions).astype(str))
+    return '\n'.join(lines.tolist()) + '\n'
+
+
+def score_csv(model, in_path='test.csv', out_path='gendermodel.csv',
+              chunksize=titanic.DEFAULT_CHUNKSIZE, usecols=None):
+    """ Scores a passenger file with model and writes a Kaggle submission.
+
+    Args:
+        model: Function from a TitanicTable to an array of predictions.
+        in_path: Passenger file to score.
+        out_path: Predictions file to write, with a PassengerId,Survived
+            header.
+        chunksize: Number of passengers read, scored and written at a time.
+        usecols: Optional list of columns the model needs; reading only
+            those makes scoring faster. PassengerId is always read.
+
+    Returns:
+        The number of passengers scored.
+
+    """
+
+    if usecols is not None:
+        usecols = set(usecols) | set(['PassengerId'])
+    n = 0
+    with open(out_path, 'w') as out_file:
+        out_file.write('PassengerId,Survived\n')
+        for chunk in titanic.iter_chunks(in_path, chunksize=chunksize,
+                                         usecols=usecols):
+            out_file.write(format_predictions(chunk['PassengerId'],
+                                              model(chunk)))
+            n += len(chunk)
+    return n
+
+
+if __name__ == '__main__':
+
+    # Same output as gendermodel.py, one chunk at a time.
+    n = score_csv(gender_model, 'test.csv', 'gendermodel.csv',
+                  usecols=['Sex'])
+    print('Scored %d passengers.' % n)
+
+    # Survival rates by sex, class, fare and age, learned from train.csv.
+    train = titanic.load_titanic('train.csv')
+    model = LookupModel().fit(train)
+    print('Training accuracy of the lookup model is %s'
+          % np.mean(model(train) == train['Survived']))
+    print(model)
+    n = score_csv(model, 'test.csv', 'lookupmodel.csv', usecols=model.usecols)
+    print('Scored %d passengers.' % n)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+User-agent parsing for web server logs, built on Exercise 1.
+
+Exercise 1 finds the operating system and browser of a user with fixed
+slices such as user_string1[13:27], which only work for the example strings.
+Here both are found with precompiled regular expressions that are tried in
+order, most specific first:
+
+    >>> parse_user_agent('Mozilla/5.0 (Windows NT 6.0; WOW64) AppleWebKit/'
+    ...                  '536.4 (KHTML, like Gecko) Safari/536.4')
+    UserAgent(os='Windows NT 6.0', browser='Safari', version='536.4')
+
+Logs hold millions of user-agent strings but only a few thousand distinct
+ones, so results are kept in a bounded LRU cache keyed by the raw string.
+
+"""
+
+import collections
+import functools
+import re
+
+UserAgent = collections.namedtuple('UserAgent', ['os', 'browser', 'version'])
+
+UNKNOWN = 'Unknown'
+
+# (pattern, name) pairs; the first match wins. A name containing '%s' is
+# filled in with the version captured by the pattern, dots for underscores.
+OS_PATTERNS = [(re.compile(pattern), name) for pattern, name in [
+    (r'Windows Phone(?: OS)? ([\d.]+)', 'Windows Phone %s'),
+    (r'Android ?([\d.]*)', 'Android %s'),
+    (r'(?:iPhone|CPU) OS ([\d_]+)', 'iOS %s'),
+    (r'iPad.*? OS ([\d_]+)', 'iOS %s'),
+    (r'CrOS \S+ ([\d.]+)', 'Chrome OS %s'),
+    (r'(Windows NT [\d.]+)', '%s'),
+    (r'(Windows [^;)]+)', '%s'),
+    (r'Mac OS X ?([\d_.]*)', 'Mac OS X %s'),
+    (r'Ubuntu', 'Ubuntu'),
+    (r'Linux', 'Linux'),
+]]
+
+BROWSER_PATTERNS = [(re.compile(pattern), name) for pattern, name in [
+    (r'Edge?/([\d.]+)', 'Edge'),
+    (r'OPR/([\d.]+)', 'Opera'),
+    (r'Opera.*?Version/([\d.]+)', 'Opera'),
+    (r'Opera[/ ]([\d.]+)', 'Opera'),
+    (r'(?:Chrome|CriOS)/([\d.]+)', 'Chrome'),
+    (r'(?:Firefox|FxiOS)/([\d.]+)', 'Firefox'),
+    (r'MSIE ([\d.]+)', 'Internet Explorer'),
+    (r'Trident/.*?rv:([\d.]+)', 'Internet Explorer'),
+    (r'Version/([\d.]+).*?Safari/', 'Safari'),
+    (r'Safari/([\d.]+)', 'Safari'),
+]]
+
+# Fallback for browsers not listed above: the last product/version token.
+LAST_PRODUCT = re.compile(r'([A-Za-z][\w.-]*)/([\d.]+)[^/]*$')
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+def _parse_os(user_string):
+    for pattern, name in OS_PATTERNS:
+        match = pattern.search(user_string)
+        if match:
+            if '%s' in name:
+                name = name % match.group(1).replace('_', '.')
+            return name.strip()
+    return UNKNOWN
+
+
+def _parse_browser(user_string):
+    for pattern, name in BROWSER_PATTERNS:
+        match = pattern.search(user_string)
+        if match:
+            return name, match.group(1)
+    match = LAST_PRODUCT.search(user_string)
+    if match:
+        return match.group(1), match.group(2)
+    return UNKNOWN, ''
+
+
+def parse_uncached(user_string):
+    """ Returns the UserAgent (os, browser, version) of a user-agent string.
+
+    Args:
+        user_string: Raw user-agent string, e.g. from a web server log.
+
+    """
+
+    browser, version = _parse_browser(user_string)
+    return UserAgent(_parse_os(user_string), browser, version)
+
+
+class UserAgentParser(object):
+    """ User-agent parser with a bounded LRU cache of parsed strings.
+
+    Args:
+        maxsize: Maximum number of distinct strings kept in the cache.
+
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._parse = functools.lru_cache(maxsize=maxsize)(parse_uncached)
+
+    def parse(self, user_string):
+        """ Returns the UserAgent of one user-agent string. """
+        return self._parse(user_string)
+
+    def parse_many(self, user_strings):
+        """ Returns the list of UserAgents of a batch of user-agent strings. """
+        return list(map(self._parse, user_strings))
+
+    @property
+    def hits(self):
+        """ Number of lookups answered from the cache. """
+        return self._parse.cache_info().hits
+
+    @property
+    def misses(self):
+        """ Number of lookups that had to parse the string. """
+        return self._parse.cache_info().misses
+
+    def cache_info(self):
+        """ Returns (hits, misses, maxsize, currsize) of the cache. """
+        return self._parse.cache_info()
+
+    def clear(self):
+        """ Empties the cache and resets the counters. """
+        self._parse.cache_clear()
+
+
+# Shared parser used by the module level functions.
+_default_parser = UserAgentParser()
+
+
+def parse_user_agent(user_string):
+    """ Returns the UserAgent of user_string, using the shared cache. """
+    return _default_parser.parse(user_string)
+
+
+def parse_user_agents(user_strings):
+    """ Returns the UserAgents of a batch of strings, using the shared cache. """
+    return _default_parser.parse_many(user_strings)
+
+
+def normalize(name):
+    """ Returns name lowercased with runs of whitespace collapsed. """
+    return ' '.join(name.lower().split())
+
+
+class UserAgentIndex(object):
+    """ Inverted index from operating system and browser to user ids.
+
+    Exercise 1.6 compares two users by searching one lowercased string for
+    the other, a scan per pair. Here every user is parsed once when added,
+    and the index maps each normalized OS, browser and (OS, browser) key to
+    the set of users that have it, so both lookups and pairwise checks are
+    dictionary operations:
+
+        index = UserAgentIndex()
+        index.add('user1', user_string1)
+        index.add('user2', user_string2)
+        index.same('user1', 'user2', by='os')
+        index.matches('user1', by='both')
+
+    Adding a user that is already indexed replaces their user agent.
+
+    Args:
+        parser: UserAgentParser used for raw strings; the shared one if None.
+
+    """
+
+    BY = ('os', 'browser', 'both')
+
+    def __init__(self, parser=None):
+        self.parser = parser or _default_parser
+        self._keys = {}
+        self._users = dict((by, collections.defaultdict(set))
+                           for by in self.BY)
+
+    @staticmethod
+    def _index_keys(user_agent):
+        os_ = normalize(user_agent.os)
+        browser = normalize(user_agent.browser)
+        return {'os': os_, 'browser': browser, 'both': (os_, browser)}
+
+    def add(self, user_id, user_agent):
+        """ Indexes one user.
+
+        Args:
+            user_id: Any hashable id of the user.
+            user_agent: Raw user-agent string or parsed UserAgent.
+
+        """
+
+        if not isinstance(user_agent, UserAgent):
+            user_agent = self.parser.parse(user_agent)
+        self.remove(user_id)
+        keys = self._index_keys(user_agent)
+        self._keys[user_id] = keys
+        for by in self.BY:
+            self._users[by][keys[by]].add(user_id)
+
+    def add_many(self, pairs):
+        """ Indexes an iterable of (user_id, user_agent) pairs. """
+        for user_id, user_agent in pairs:
+            self.add(user_id, user_agent)
+
+    def remove(self, user_id):
+        """ Removes a user from the index, if present. """
+        keys = self._keys.pop(user_id, None)
+        if keys is None:
+            return
+        for by in self.BY:
+            users = self._users[by][keys[by]]
+            users.discard(user_id)
+            if not users:
+                del self._users[by][keys[by]]
+
+    def key(self, user_id, by='both'):
+        """ Returns the normalized key of a user: os, browser or both. """
+        return self._keys[user_id][by]
+
+    def users(self, os_=None, browser=None):
+        """ Returns the set of users with the given OS and/or browser. """
+        if os_ is not None and browser is not None:
+            by, key = 'both', (normalize(os_), normalize(browser))
+        elif os_ is not None:
+            by, key = 'os', normalize(os_)
+        elif browser is not None:
+            by, key = 'browser', normalize(browser)
+        else:
+            return set(self._keys)
+        return set(self._users[by].get(key, ()))
+
+    def same(self, user_id1, user_id2, by='os'):
+        """ Returns True if two users share an OS, browser or both. """
+        return self._keys[user_id1][by] == self._keys[user_id2][by]
+
+    def matches(self, user_id, by='os'):
+        """ Returns the other users that share an OS, browser or both. """
+        users = self._users[by][self._keys[user_id][by]]
+        return users - set([user_id])
+
+    def __contains__(self, user_id):
+        return user_id in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+
+if __name__ == '__main__':
+
+    # The user strings from Exercise 1.
+    user_string1 = 'Mozilla/5.0 (Windows NT 6.0; WOW64) App3leWebKit/54.1 \
+(KHTML, like Gecko) Version/4.0 Safari/539.1'
+    user_string2 = 'Mozilla/5.0 (Linux; Android 3.2) AppleWebKit/536.4 \
+(KHTML, like Gecko) Safari/536.4'
+    user_string3 = 'Mozilla/5.0 (Windows NT 6.0; WOW64) AppleWebKit/536.4 \
+(KHTML, like Gecko) Safari/536.4'
+
+    for user_agent in parse_user_agents([user_string1, user_string2,
+                                         user_string3, user_string1]):
+        print(user_agent)
+    print(_default_parser.cache_info())
+
+    # Exercise 1.6: do users 2 and 3 use the same OS as user 1?
+    index = UserAgentIndex()
+    index.add_many([('user1', user_string1), ('user2', user_string2),
+                    ('user3', user_string3)])
+    print(index.same('user1', 'user2'))
+    print(index.same('user1', 'user3'))
+    print(index.matches('user1', by='os'))
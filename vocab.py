@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2015 by Patrick Hall, jpatrickhall@gmail.com
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+-------------------------------------------------------------------------------
+
+Integer token ids for the profile corpus of Exercise 3.
+
+Exercises 3.4 and 3.5 keep every token as its own Python string in lists and
+Counters. Here each distinct term is stored once, in a Vocabulary, and gets
+a small integer id. A Corpus stores all its documents as one array('I') of
+ids plus an array of document offsets, 4 bytes per token, and all counting
+is done on the ids with NumPy:
+
+    corpus = Corpus()
+    for line in open('profiles_clean.txt'):
+        corpus.add(line.split())
+    counts = corpus.term_counts()               # counts[id]
+    keep = corpus.keep_mask(10)                 # the keep_set, by id
+    corpus.document_term_counts(0, keep)        # [(term, count), ...]
+
+"""
+
+import array
+
+import numpy as np
+
+
+class Vocabulary(object):
+    """ Two-way mapping between terms and consecutive integer ids. """
+
+    def __init__(self, terms=()):
+        self._ids = {}
+        self.terms = []
+        for term in terms:
+            self.id(term)
+
+    def id(self, term):
+        """ Returns the id of term, adding it to the vocabulary if needed. """
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def get(self, term, default=None):
+        """ Returns the id of term, or default if it is not in the vocabulary. """
+        return self._ids.get(term, default)
+
+    def encode(self, tokens):
+        """ Returns the ids of tokens as an array('I'). """
+        return array.array('I', map(self.id, tokens))
+
+    def decode(self, ids):
+        """ Returns the list of terms of a sequence of ids. """
+        terms = self.terms
+        return [terms[term_id] for term_id in ids]
+
+    def __getitem__(self, term_id):
+        return self.terms[term_id]
+
+    def __contains__(self, term):
+        return term in self._ids
+
+    def __len__(self):
+        return len(self.terms)
+
+
+class Corpus(object):
+    """ Documents stored as one flat array of token ids.
+
+    Document i is ids[offsets[i]:offsets[i + 1]].
+
+    Args:
+        vocabulary: Vocabulary to encode with; a new one if None.
+
+    """
+
+    def __init__(self, vocabulary=None):
+        self.vocabulary = vocabulary if vocabulary is not None \
+            else Vocabulary()
+        self.ids = array.array('I')
+        self.offsets = array.array('Q', [0])
+
+    def add(self, tokens):
+        """ Appends a document (a sequence of term strings). """
+        self.ids.extend(self.vocabulary.encode(tokens))
+        self.offsets.append(len(self.ids))
+
+    def arrays(self):
+        """ Returns copies of (ids, offsets) as NumPy arrays. """
+        return (np.array(self.ids, dtype=np.uint32),
+                np.array(self.offsets, dtype=np.int64))
+
+    def document(self, i):
+        """ Returns the ids of document i as a NumPy array. """
+        return np.array(self.ids[self.offsets[i]:self.offsets[i + 1]],
+                        dtype=np.uint32)
+
+    def term_counts(self):
+        """ Returns the number of occurrences of every term id. """
+        return np.bincount(np.array(self.ids, dtype=np.intp),
+                           minlength=len(self.vocabulary))
+
+    def keep_mask(self, min_count=10):
+        """ Returns a boolean array over ids: True if the term occurs at least
+        min_count times in the corpus (the keep_set of Exercise 3.4).
+
+        """
+
+        return self.term_counts() >= min_count
+
+    def keep_set(self, min_count=10):
+        """ Returns the keep_set of Exercise 3.4 as a set of terms. """
+        return set(self.vocabulary.decode(
+            np.flatnonzero(self.keep_mask(min_count))))
+
+    def document_term_counts(self, i, keep_mask=None):
+        """ Returns the (term, count) pairs of document i.
+
+        Terms are listed in the order of their first occurrence, like a
+        Counter built from the document's tokens.
+
+        Args:
+            i: Document index.
+            keep_mask: Optional boolean array over ids; terms where it is
+                False are left out.
+
+        """
+
+        return document_term_counts(self.document(i), self.vocabulary,
+                                    keep_mask)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def document_term_counts(ids, vocabulary, keep_mask=None):
+    """ Returns the (term, count) pairs of a document given by its ids.
+
+    See Corpus.document_term_counts().
+
+    """
+
+    ids = np.asarray(ids)
+    if keep_mask is not None:
+        ids = ids[keep_mask[ids]]
+    unique_ids, first, counts = np.unique(ids, return_index=True,
+                                          return_counts=True)
+    order = np.argsort(first, kind='stable')
+    return list(zip(vocabulary.decode(unique_ids[order]),
+                    counts[order].tolist()))